@@ -0,0 +1,184 @@
+"""Массовая выгрузка и загрузка данных бота.
+
+Работает напрямую с файлом SQLite (DATABASE_PATH или --database). Выгружать
+можно и на запущенном боте. Загрузка тоже пишет в базу без остановки бота, но
+планировщик бота держит будильники и часовые пояса в памяти: загруженное он
+увидит только после перезапуска. Данные идут потоком: выгрузка читает курсор
+порциями, загрузка пишет пачками по одной транзакции, так что память не
+зависит от размера таблицы.
+
+    python admin.py export statistics --format csv --output statistics.csv
+    python admin.py export users > users.jsonl
+    python admin.py import users users.jsonl
+    python admin.py import alarms alarms.csv --batch-size 10000
+
+Формат определяется по расширению файла (.csv, иначе JSON Lines) или задается
+--format. Повторная загрузка users и alarms обновляет строки, statistics - дописывает.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+from config import DATABASE_PATH, IMPORT_BATCH_SIZE, EXPORT_FETCH_SIZE
+from database import Database, STATUSES, TRANSFER_COLUMNS
+from scheduler import MINUTES_PER_DAY, parse_zone
+
+# Колонки с минутой от начала суток
+MINUTE_COLUMNS = ('start_minute', 'end_minute', 'wake_minute')
+# Обязательные колонки, кроме user_id
+REQUIRED_COLUMNS = {'alarms': ('start_minute', 'end_minute'), 'statistics': ('date', 'status')}
+
+
+def read_jsonl(lines):
+    """Записи из JSON Lines; пустые строки пропускаются"""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(lines):
+    """Записи из CSV с заголовком; пустое поле - None"""
+    for record in csv.DictReader(lines):
+        yield {name: value if value != "" else None for name, value in record.items()}
+
+
+def write_jsonl(out, columns, rows):
+    for row in rows:
+        out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        out.write("\n")
+
+
+def write_csv(out, columns, rows):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    writer.writerows(rows)
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv}
+
+
+def check_row(table: str, row: tuple):
+    """Отвергнуть значения, с которыми бот не сможет работать: минуты вне суток, неизвестные часовые пояса,
+    даты не в ISO 8601 и неизвестные статусы статистики"""
+    values = dict(zip((name for name, _ in TRANSFER_COLUMNS[table]), row))
+    if values['user_id'] is None:
+        raise ValueError("нет user_id")
+    for name in REQUIRED_COLUMNS.get(table, ()):
+        if values[name] is None:
+            raise ValueError(f"нет {name}")
+    for name in MINUTE_COLUMNS:
+        minute = values.get(name)
+        if minute is not None and not 0 <= minute < MINUTES_PER_DAY:
+            raise ValueError(f"{name}={minute} вне 0..{MINUTES_PER_DAY - 1}")
+    timezone = values.get('timezone')
+    if timezone is not None and parse_zone(timezone) is None:
+        raise ValueError(f"неизвестный часовой пояс {timezone!r}")
+    if table == 'statistics':
+        # День для daily_stats берется из первых 10 символов, поэтому нужна полная форма YYYY-MM-DD
+        try:
+            day = datetime.fromisoformat(values['date']).date().isoformat()
+        except ValueError:
+            day = None
+        if values['date'][:10] != day:
+            raise ValueError(f"дата {values['date']!r} не в формате ISO 8601 (YYYY-MM-DD[THH:MM:SS])")
+        if values['status'] not in STATUSES:
+            raise ValueError(f"неизвестный статус {values['status']!r}, допустимы: {', '.join(STATUSES)}")
+
+
+def to_rows(table: str, records):
+    """Привести записи-словари к кортежам в порядке колонок таблицы"""
+    columns = TRANSFER_COLUMNS[table]
+    for number, record in enumerate(records, 1):
+        try:
+            row = tuple(
+                None if record.get(name) is None else kind(record[name])
+                for name, kind in columns
+            )
+            check_row(table, row)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"запись {number}: {e}") from None
+        yield row
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path and path.endswith(".csv") else "jsonl"
+
+
+def export_table(db: Database, table: str, out, fmt: str, fetch_size: int) -> int:
+    """Выгрузить таблицу в out; вернуть число строк"""
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    columns = [name for name, _ in TRANSFER_COLUMNS[table]]
+    WRITERS[fmt](out, columns, counted(db.export_rows(table, fetch_size)))
+    return count
+
+
+def import_table(db: Database, table: str, lines, fmt: str, batch_size: int) -> int:
+    """Загрузить таблицу из строк файла; вернуть число строк"""
+    started = time.perf_counter()
+
+    def progress(total):
+        print(f"  {total} строк, {total / (time.perf_counter() - started):.0f} строк/с", file=sys.stderr)
+
+    return db.import_rows(table, to_rows(table, READERS[fmt](lines)), batch_size, on_commit=progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка пользователей, будильников и статистики")
+    parser.add_argument("--database", default=DATABASE_PATH, help="файл SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="выгрузить таблицу")
+    export.add_argument("table", choices=TRANSFER_COLUMNS)
+    export.add_argument("--output", help="файл (по умолчанию stdout)")
+    export.add_argument("--format", choices=WRITERS)
+    export.add_argument("--fetch-size", type=int, default=EXPORT_FETCH_SIZE, help="строк с курсора за раз")
+
+    load = commands.add_parser("import", help="загрузить таблицу")
+    load.add_argument("table", choices=TRANSFER_COLUMNS)
+    load.add_argument("input", help="файл или - для stdin")
+    load.add_argument("--format", choices=READERS)
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    db = Database(args.database)
+    try:
+        if args.command == "export":
+            fmt = detect_format(args.output, args.format)
+            out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+            try:
+                count = export_table(db, args.table, out, fmt, args.fetch_size)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"✅ Выгружено строк из {args.table}: {count}", file=sys.stderr)
+        else:
+            path = None if args.input == "-" else args.input
+            fmt = detect_format(path, args.format)
+            lines = open(path, newline="", encoding="utf-8") if path else sys.stdin
+            try:
+                count = import_table(db, args.table, lines, fmt, args.batch_size)
+            except ValueError as e:
+                sys.exit(f"❌ {e}; загруженные до этого пачки сохранены")
+            finally:
+                if lines is not sys.stdin:
+                    lines.close()
+            print(f"✅ Загружено строк в {args.table}: {count}", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
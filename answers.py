@@ -0,0 +1,93 @@
+import re
+from functools import lru_cache
+
+from config import ANSWER_CACHE_SIZE
+
+# Числительные -> значения. Порядковые приравнены к количественным:
+# "двадцать второй" и "22" считаются одним ответом.
+NUMBER_WORDS = {
+    "ноль": 0, "нуль": 0, "нулевой": 0,
+    "один": 1, "одна": 1, "одно": 1, "первый": 1,
+    "два": 2, "две": 2, "второй": 2,
+    "три": 3, "третий": 3,
+    "четыре": 4, "четвертый": 4,
+    "пять": 5, "пятый": 5,
+    "шесть": 6, "шестой": 6,
+    "семь": 7, "седьмой": 7,
+    "восемь": 8, "восьмой": 8,
+    "девять": 9, "девятый": 9,
+    "десять": 10, "десятый": 10,
+    "одиннадцать": 11, "одиннадцатый": 11,
+    "двенадцать": 12, "двенадцатый": 12,
+    "тринадцать": 13, "тринадцатый": 13,
+    "четырнадцать": 14, "четырнадцатый": 14,
+    "пятнадцать": 15, "пятнадцатый": 15,
+    "шестнадцать": 16, "шестнадцатый": 16,
+    "семнадцать": 17, "семнадцатый": 17,
+    "восемнадцать": 18, "восемнадцатый": 18,
+    "девятнадцать": 19, "девятнадцатый": 19,
+    "двадцать": 20, "двадцатый": 20,
+    "тридцать": 30, "тридцатый": 30,
+    "сорок": 40, "сороковой": 40,
+    "пятьдесят": 50, "пятидесятый": 50,
+    "шестьдесят": 60, "шестидесятый": 60,
+    "семьдесят": 70, "семидесятый": 70,
+    "восемьдесят": 80, "восьмидесятый": 80,
+    "девяносто": 90, "девяностый": 90,
+    "сто": 100, "сотый": 100,
+    "двести": 200, "триста": 300, "четыреста": 400, "пятьсот": 500,
+    "шестьсот": 600, "семьсот": 700, "восемьсот": 800, "девятьсот": 900,
+}
+THOUSAND_WORDS = {"тысяча", "тысячи", "тысяч", "тысячный"}
+
+EDGE_PUNCTUATION = " \t\n.,;:!?\"'«»()"
+SEPARATORS = re.compile(r"[\s\-]+")
+# "22-й", "22й", "22-ой" -> "22"
+ORDINAL_DIGITS = re.compile(r"^(\d+)-?(?:й|ой|ый|ий)$")
+
+
+def words_to_number(tokens):
+    """Переводит список числительных в число или возвращает None"""
+    total = current = 0
+    for token in tokens:
+        if token in THOUSAND_WORDS:
+            total += max(current, 1) * 1000
+            current = 0
+        elif token in NUMBER_WORDS:
+            current += NUMBER_WORDS[token]
+        else:
+            return None
+    return total + current
+
+
+@lru_cache(maxsize=ANSWER_CACHE_SIZE)
+def normalize_answer(text: str) -> str:
+    """Каноническая форма ответа: регистр, ё/е, пробелы, числа словами -> цифры"""
+    text = text.casefold().replace("ё", "е").strip(EDGE_PUNCTUATION)
+    match = ORDINAL_DIGITS.match(text)
+    if match:
+        return str(int(match.group(1)))
+    if text.isdecimal():
+        return str(int(text))
+
+    tokens = [token for token in SEPARATORS.split(text) if token]
+    if not tokens:
+        return ""
+
+    number = words_to_number(tokens)
+    if number is not None:
+        return str(number)
+    return " ".join(tokens)
+
+
+def validate_answer(user_answer: str, correct_answer: str) -> bool:
+    """Проверить ответ пользователя: сравниваются канонические формы"""
+    if not user_answer or not correct_answer:
+        return False
+    return normalize_answer(user_answer) == normalize_answer(correct_answer)
+
+
+def warm_up(answers):
+    """Заранее привести ответы банка к канонической форме"""
+    for answer in answers:
+        normalize_answer(answer)
@@ -0,0 +1,351 @@
+"""Микробенчмарки горячих путей бота.
+
+Меряет методы Database на таблицах из 1k/100k/1M строк, генерацию времени
+пробуждения, один проход check_alarms, загрузку планировщика из базы и из
+снимка, маршрутизацию handle_message для каждой кнопки меню и выбор/проверку
+головоломок.
+
+    python bench.py --output bench.json                 # прогон
+    python bench.py --save-baseline                     # сохранить эталон
+    python bench.py --sizes 1000 --threshold 0.25       # сравнить с эталоном
+
+Результат - JSON {имя: {"ns_per_op": ..., "ops": ...}}. Если операция стала
+медленнее эталона больше чем на threshold, скрипт завершается с кодом 1.
+Эталон зависит от машины: сравнивайте прогоны на одном и том же железе.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Окружение задается до импорта модулей бота: они читают config при импорте
+WORKDIR = tempfile.mkdtemp(prefix="alarm-bench-")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ["OUTBOUND_RATE"] = "1000000000"
+os.environ["OUTBOUND_BURST"] = "1000000000"
+os.environ["CHAT_SEND_INTERVAL"] = "0.000001"
+os.environ["SNAPSHOT_PATH"] = os.path.join(WORKDIR, "scheduler.snapshot")
+
+import handlers  # noqa: E402
+import main  # noqa: E402
+from database import Database  # noqa: E402
+from puzzle_bank import PuzzleBank  # noqa: E402
+from puzzles import bank, get_random_puzzle, validate_answer  # noqa: E402
+from sketch import QuantileSketch  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+MENU_BUTTONS = ("🕐 Установить будильник", "📊 Моя статистика", "🧩 Пример головоломки", "❓ Помощь")
+
+
+def measure(fn, min_time: float = 0.2, repeats: int = 3):
+    """Лучшее из repeats значение наносекунд на вызов; число вызовов подбирается под min_time"""
+    best, total_ops = None, 0
+    for _ in range(repeats):
+        ops, started = 0, time.perf_counter()
+        while True:
+            fn()
+            ops += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time:
+                break
+        total_ops += ops
+        per_op = elapsed / ops * 1e9
+        best = per_op if best is None else min(best, per_op)
+    return {"ns_per_op": best, "ops": total_ops}
+
+
+def measure_async(loop, factory, min_time: float = 0.2, repeats: int = 3):
+    """То же для корутин: каждый вызов factory() дожидается в цикле событий"""
+    return measure(lambda: loop.run_until_complete(factory()), min_time, repeats)
+
+
+def make_storage(backend: str, name: str):
+    """Хранилище выбранного вида; файл SQLite создается во временном каталоге"""
+    if backend == "memory":
+        return MemoryStorage()
+    return Database(os.path.join(WORKDIR, f"{name}.db"))
+
+
+def populate_memory(db: MemoryStorage, rows: int):
+    """То же, что populate, через методы хранилища в памяти (статистика - за сегодня)"""
+    fire_at = int(time.time())
+    statuses = ("success", "failed_first", "failed_second")
+    for user_id in range(rows):
+        db.save_user(user_id, f"user{user_id}", None)
+        db.set_alarm(user_id, 420, 450, 435, fire_at + user_id % 86400)
+        db.set_user_state(user_id, "SLEEP")
+    for _ in range(rows):
+        db.add_statistics(random.randrange(rows), random.choice(statuses))
+
+
+def populate(db, rows: int):
+    """Заполнить users, alarms, user_states и статистику rows строками"""
+    if isinstance(db, MemoryStorage):
+        return populate_memory(db, rows)
+
+    now = datetime.now().isoformat()
+    fire_at = int(time.time())
+    today = date.today()
+    statuses = ("success", "failed_first", "failed_second")
+    with db.pool.write() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, first_name, username, created_at) VALUES (?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", None, now) for user_id in range(rows))
+        )
+        conn.executemany(
+            "INSERT INTO alarms (user_id, start_minute, end_minute, wake_minute, next_fire_at, created_at) VALUES (?, 420, 450, 435, ?, ?)",
+            ((user_id, fire_at + user_id % 86400, now) for user_id in range(rows))
+        )
+        conn.executemany(
+            "INSERT INTO user_states (user_id, state) VALUES (?, 'SLEEP')",
+            ((user_id,) for user_id in range(rows))
+        )
+        conn.executemany(
+            "INSERT INTO statistics (user_id, date, status) VALUES (?, ?, ?)",
+            ((random.randrange(rows), (today - timedelta(days=random.randrange(365))).isoformat(),
+              random.choice(statuses)) for _ in range(rows))
+        )
+        # Накопительные счетчики строим так же, как миграция 4
+        conn.execute('''
+            INSERT OR REPLACE INTO daily_stats (user_id, day, success, failed_first, failed_second)
+            SELECT user_id, substr(date, 1, 10),
+                   SUM(status = 'success'), SUM(status = 'failed_first'), SUM(status = 'failed_second')
+            FROM statistics GROUP BY user_id, substr(date, 1, 10)
+        ''')
+        conn.execute('''
+            INSERT OR REPLACE INTO user_stats (user_id, success, failed_first, failed_second)
+            SELECT user_id, SUM(success), SUM(failed_first), SUM(failed_second)
+            FROM daily_stats GROUP BY user_id
+        ''')
+
+
+def bench_database(backend: str, rows: int, min_time: float) -> dict:
+    db = make_storage(backend, f"bench_{rows}")
+    populate(db, rows)
+    pick = lambda: random.randrange(rows)  # noqa: E731
+    fire_at = int(time.time()) + 3600
+    batch = [(user_id, 435, fire_at) for user_id in range(min(rows, 1000))]
+    write_states = [(user_id, "SLEEP", None, None, None, None) for user_id in range(min(rows, 500))]
+    write_statistics = [(user_id, "success") for user_id in range(min(rows, 500))]
+
+    cases = {
+        "save_user": lambda: db.save_user(pick(), "bench", "bench"),
+        "get_user_state": lambda: db.get_user_state(pick()),
+        "set_user_state": lambda: db.set_user_state(pick(), "SLEEP"),
+        "get_timezone": lambda: db.get_timezone(pick()),
+        "set_timezone": lambda: db.set_timezone(pick(), "Europe/Moscow"),
+        "set_alarm": lambda: db.set_alarm(pick(), 420, 450, 435, fire_at),
+        "get_active_alarms": lambda: db.get_active_alarms(),
+        "update_alarm_wake_time": lambda: db.update_alarm_wake_time(pick(), 430, fire_at),
+        "update_alarm_wake_times_x1000": lambda: db.update_alarm_wake_times(batch),
+        "add_statistics": lambda: db.add_statistics(pick(), "success"),
+        "get_statistics": lambda: db.get_statistics(pick()),
+        "get_statistics_report": lambda: db.get_statistics_report(pick()),
+        "set_user_state[outcome]": lambda: db.set_user_state(pick(), "SLEEP", outcome="success"),
+        "write_batch_x500": lambda: db.write_batch(write_states, write_statistics),
+        "get_active_sessions": lambda: db.get_active_sessions(),
+    }
+    prefix = "memory" if backend == "memory" else "db"
+    results = {f"{prefix}.{name}[{rows}]": measure(fn, min_time) for name, fn in cases.items()}
+    db.close()
+    return results
+
+
+class FakeBot:
+    async def send_message(self, chat_id, text, **kwargs):
+        return None
+
+
+class FakeContext:
+    bot = FakeBot()
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+    async def reply_text(self, text, **kwargs):
+        return None
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.first_name = "bench"
+        self.username = "bench"
+
+
+class FakeUpdate:
+    def __init__(self, user_id: int, text: str):
+        self.effective_user = FakeUser(user_id)
+        self.message = FakeMessage(text)
+
+
+def backend_label(name: str, backend: str) -> str:
+    # Замеры на хранилище в памяти не сравниваются с эталоном SQLite
+    return name if backend == "sqlite" else f"{name}@{backend}"
+
+
+def bench_routing(loop, backend: str, min_time: float) -> dict:
+    results = {}
+    for text in MENU_BUTTONS + ("7:00 - 7:30", "привет"):
+        async def route(text=text):
+            await handlers.handle_message(FakeUpdate(1, text), FakeContext())
+            handlers.user_example_puzzles.clear()
+        results[backend_label(f"handle_message[{text}]", backend)] = measure_async(loop, route, min_time)
+    return results
+
+
+def insert_alarms(db, rows: int, due_count: int, now: int):
+    """Будильники 0..rows-1: первые due_count наступили минуту назад, остальные через час"""
+    fire_times = ((user_id, now - 60 if user_id < due_count else now + 3600) for user_id in range(rows))
+    if isinstance(db, MemoryStorage):
+        for user_id, fire_at in fire_times:
+            db.set_alarm(user_id, 420, 450, 435, fire_at)
+        return
+    with db.pool.write() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO alarms (user_id, start_minute, end_minute, wake_minute, next_fire_at) VALUES (?, 420, 450, 435, ?)",
+            fire_times
+        )
+
+
+def bench_check_alarms(loop, backend: str, rows: int, due_fraction: float = 0.01) -> dict:
+    """Один проход check_alarms по таблице rows будильников, из которых due_fraction наступили"""
+    db = handlers.db.sync
+    if isinstance(db, Database):
+        with db.pool.write() as conn:
+            conn.execute("DELETE FROM alarms")
+
+    due_count = max(1, int(rows * due_fraction))
+    handlers.dispatcher.start(FakeBot())
+
+    timings = []
+    for _ in range(3):
+        insert_alarms(db, rows, due_count, int(time.time()))
+        loop.run_until_complete(main.load_alarms())
+
+        started = time.perf_counter()
+        loop.run_until_complete(main.check_alarms(FakeContext()))
+        timings.append(time.perf_counter() - started)
+        loop.run_until_complete(handlers.dispatcher.drain())
+
+    name = backend_label(f"check_alarms[{rows} alarms, {due_count} due]", backend)
+    return {name: {"ns_per_op": min(timings) * 1e9, "ops": len(timings)}}
+
+
+def bench_startup(loop, backend: str, rows: int) -> dict:
+    """Загрузка планировщика при запуске: из базы и из снимка (таблица будильников - от bench_check_alarms)"""
+    cold, warm = [], []
+    for _ in range(3):
+        started = time.perf_counter()
+        loop.run_until_complete(main.load_alarms())
+        cold.append(time.perf_counter() - started)
+
+        main.save_scheduler_snapshot()
+        started = time.perf_counter()
+        loop.run_until_complete(main.warm_start())
+        warm.append(time.perf_counter() - started)
+
+    return {
+        backend_label(f"startup.load_alarms[{rows} alarms]", backend): {"ns_per_op": min(cold) * 1e9, "ops": len(cold)},
+        backend_label(f"startup.warm_start[{rows} alarms]", backend): {"ns_per_op": min(warm) * 1e9, "ops": len(warm)},
+    }
+
+
+def bench_puzzles(min_time: float) -> dict:
+    puzzle = get_random_puzzle()
+    sketch = QuantileSketch()
+    for _ in range(1000):
+        sketch.add(random.lognormvariate(3, 1))
+    return {
+        "quantile_sketch.add": measure(lambda: sketch.add(random.uniform(1, 300)), min_time),
+        "quantile_sketch.quantile": measure(lambda: sketch.quantile(0.9), min_time),
+        "quantile_sketch.to_bytes": measure(sketch.to_bytes, min_time),
+        "generate_random_wake_time": measure(lambda: handlers.generate_random_wake_time(420, 450), min_time),
+        "get_random_puzzle": measure(get_random_puzzle, min_time),
+        "puzzle_bank.sample": measure(bank.sample, min_time),
+        "puzzle_bank.open": measure(lambda: PuzzleBank().close(), min_time),
+        "validate_answer[correct]": measure(lambda: validate_answer(puzzle["answer"], puzzle["answer"]), min_time),
+        "validate_answer[words]": measure(lambda: validate_answer("двадцать второй", "22"), min_time),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Список (имя, эталон, сейчас) для операций, замедлившихся больше чем на threshold"""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            before, after = baseline[name]["ns_per_op"], result["ns_per_op"]
+            if after > before * (1 + threshold):
+                regressions.append((name, before, after))
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Микробенчмарки бота 'Доброе утро'")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="размеры таблиц через запятую")
+    parser.add_argument("--min-time", type=float, default=0.2, help="секунд на один замер")
+    parser.add_argument("--backend", choices=("sqlite", "memory"), default="sqlite", help="хранилище")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="файл эталона")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результат как эталон")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление, доля")
+    parser.add_argument("--output", help="куда сохранить результат в JSON")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    # Логи каждого срабатывания будильника только мешают замерам
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    handlers.use_storage(make_storage(args.backend, "handlers"))
+
+    results = {}
+    try:
+        for rows in sizes:
+            print(f"⏱  Хранилище {args.backend} на {rows} строках...", file=sys.stderr)
+            results.update(bench_database(args.backend, rows, args.min_time))
+        results.update(bench_puzzles(args.min_time))
+        results.update(bench_routing(loop, args.backend, args.min_time))
+        results.update(bench_check_alarms(loop, args.backend, max(sizes)))
+        results.update(bench_startup(loop, args.backend, max(sizes)))
+    finally:
+        loop.run_until_complete(handlers.db.flush())
+        handlers.db.close()
+        loop.close()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    for name, result in results.items():
+        print(f"{name:60s} {result['ns_per_op'] / 1000:12.1f} мкс", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Эталон сохранен в {args.baseline}", file=sys.stderr)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, before, after in regressions:
+            print(f"❌ {name}: {before / 1000:.1f} -> {after / 1000:.1f} мкс", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ Регрессий нет", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
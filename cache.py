@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+# Маркер отсутствия ключа (None - допустимое закешированное значение)
+MISSING = object()
+
+
+class LRUCache:
+    """Ограниченный кеш с вытеснением давно не использованных записей.
+
+    hits и misses отдаются в метриках через metrics.watch_cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """Значение по ключу или MISSING"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Положить значение, вытеснив самое старое при переполнении"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -8,10 +8,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Секундные фоновые задачи не должны засорять лог
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
+
 # Токен бота
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Адрес Bot API (можно подменить локальным сервером для проверок)
+BOT_API_URL = os.getenv("BOT_API_URL", "https://api.telegram.org/bot")
+
+# Получение обновлений: "polling" (по умолчанию) или "webhook"
+UPDATE_MODES = ("polling", "webhook")
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+if UPDATE_MODE not in UPDATE_MODES:
+    # Опечатка не должна молча включать polling: PTB при этом снимает зарегистрированный webhook
+    raise ValueError(f"Неизвестный UPDATE_MODE {UPDATE_MODE!r}, допустимы: {', '.join(UPDATE_MODES)}")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес, который регистрируется в Telegram
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+
+# Шардирование: пользователи делятся между SHARD_COUNT процессами по user_id
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))  # задается самим ботом для каждого процесса-шарда
+
+# Метрики в текстовом формате Prometheus на http://METRICS_LISTEN:METRICS_PORT/metrics (0 - выключены).
+# Процесс-шард слушает METRICS_PORT + SHARD_INDEX.
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9200"))
+
+# Профилирование (выключено по умолчанию; включается PROFILE=1 или командой /profile on)
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.1))  # доля профилируемых вызовов
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # куда складывать профили и отчеты о зависаниях
+PROFILE_STALL_MS = float(os.getenv("PROFILE_STALL_MS", 100))  # блокировка цикла событий дольше - зависание
+
+# Администраторы бота (user_id через запятую): им доступны служебные команды
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
+# База данных
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")  # sqlite или memory (в памяти, для тестов и замеров)
+DATABASE_PATH = os.getenv("DATABASE_PATH", "alarm_bot.db")
+DB_READER_POOL_SIZE = 4  # соединений на чтение в пуле
+# Отложенная запись состояний и статистики: одна транзакция на пачку
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", 0.005))  # сколько копить записи, в секундах
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))  # сбросить сразу, если накопилось столько
+WRITE_RETRY_INTERVAL = 1.0  # пауза перед повтором после неудачной записи, в секундах
+IMPORT_BATCH_SIZE = 5000  # строк в одной транзакции при массовой загрузке (admin.py import)
+EXPORT_FETCH_SIZE = 5000  # строк, читаемых с курсора за раз при выгрузке (admin.py export)
+
+# Часовой пояс (IANA) пользователей, которые не выбрали свой командой /timezone
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Moscow")
+
 # Настройки времени
 FIRST_PUZZLE_TIMEOUT = 10 * 60  # 10 минут в секундах
 SECOND_PUZZLE_TIMEOUT = 7 * 60  # 7 минут в секундах
-DELAY_BETWEEN_PUZZLES = 10 * 60  # 10 минут между головоломками
\ No newline at end of file
+DELAY_BETWEEN_PUZZLES = int(os.getenv("DELAY_BETWEEN_PUZZLES", 10 * 60))  # 10 минут между головоломками
+
+# Настройки планировщика будильников
+ALARM_TICK_INTERVAL = float(os.getenv("ALARM_TICK_INTERVAL", 5))  # как часто проверять наступившие будильники, в секундах
+MAX_ALARM_LATENESS = 15 * 60  # пропущенные будильники догоняются, если опоздание не больше 15 минут
+DEADLINE_SWEEP_INTERVAL = 1  # как часто проверять таймауты головоломок, в секундах
+# Снимок планировщика: пишется при остановке и читается при запуске вместо полной загрузки из базы.
+# Процесс-шард добавляет к имени .shard<N>; "" - не сохранять
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "scheduler.snapshot")
+
+# Исходящие сообщения (лимиты Telegram: ~30 сообщений в секунду, ~1 в секунду на чат)
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", 30))  # сообщений в секунду на всех
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", 30))  # допустимый всплеск
+CHAT_SEND_INTERVAL = float(os.getenv("CHAT_SEND_INTERVAL", 1.0))  # секунд между сообщениями одному пользователю
+
+# Головоломки
+PUZZLE_DIFFICULTY = 2  # 1 - легко, 2 - средне, 3 - сложно
+PUZZLE_POOL_SIZE = 1024  # сколько головоломок держать наготове
+# Упакованный банк (python puzzle_bank.py); по умолчанию рядом с кодом, а не в текущем каталоге
+PUZZLE_BANK_PATH = os.getenv("PUZZLE_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzles.bin"))
+SOLVE_SKETCH_CACHE_SIZE = 100_000  # скетчей времени решения пользователей в памяти
+ANSWER_CACHE_SIZE = 8192  # нормализованных ответов в кеше
@@ -1,99 +1,213 @@
+import asyncio
+import functools
+import itertools
+import queue
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import logging
 
+from collections import Counter
+from config import (
+    DATABASE_PATH, DB_READER_POOL_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BATCH_SIZE,
+    WRITE_RETRY_INTERVAL, IMPORT_BATCH_SIZE, EXPORT_FETCH_SIZE, DEFAULT_TIMEZONE
+)
+from metrics import DB_LATENCY
+from migrations import migrate
+
 logger = logging.getLogger(__name__)
 
+# Итоги пробуждения, которые пишутся в статистику
+STATUSES = ('success', 'failed_first', 'failed_second')
+
+# Колонки таблиц, которые выгружаются и загружаются целиком: (имя, тип)
+TRANSFER_COLUMNS = {
+    'users': (('user_id', int), ('first_name', str), ('username', str), ('timezone', str), ('created_at', str)),
+    'alarms': (('user_id', int), ('start_minute', int), ('end_minute', int), ('wake_minute', int),
+               ('next_fire_at', int), ('created_at', str)),
+    'statistics': (('user_id', int), ('date', str), ('status', str), ('solve_time_1', int), ('solve_time_2', int)),
+}
+
+# Загрузка: users и alarms обновляют существующие строки, statistics дописывается
+IMPORT_SQL = {
+    'users': '''
+        INSERT INTO users (user_id, first_name, username, timezone, created_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            first_name = excluded.first_name,
+            username = excluded.username,
+            timezone = COALESCE(excluded.timezone, users.timezone)
+    ''',
+    'alarms': '''
+        INSERT INTO alarms (user_id, start_minute, end_minute, wake_minute, next_fire_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            start_minute = excluded.start_minute,
+            end_minute = excluded.end_minute,
+            wake_minute = excluded.wake_minute,
+            next_fire_at = excluded.next_fire_at,
+            created_at = excluded.created_at
+    ''',
+    'statistics': "INSERT INTO statistics (user_id, date, status, solve_time_1, solve_time_2) VALUES (?, ?, ?, ?, ?)",
+}
+
+def shard_clause(shard_count: int, shard_index: int):
+    """Условие на user_id для выборки одного шарда (совпадает с sharding.shard_for)"""
+    if shard_count <= 1:
+        return "", ()
+    return " AND ((user_id % ?) + ?) % ? = ?", (shard_count, shard_count, shard_count, shard_index)
+
+# Контрольная сумма строки для сверки снимка планировщика с базой (см. snapshot.py).
+# Считается одинаково в Python и в SQL: все промежуточные значения меньше 2^63,
+# а квадрат в конце делает сумму по строкам чувствительной к перестановке
+# значений между пользователями.
+CHECKSUM_MODULUS = 2_147_483_647
+CHECKSUM_FACTOR = 1_000_003
+
+def row_checksum(*values) -> int:
+    """Контрольная сумма строки из целых чисел"""
+    checksum = 0
+    for value in values:
+        checksum = (checksum * CHECKSUM_FACTOR + value % CHECKSUM_MODULUS) % CHECKSUM_MODULUS
+    return (checksum * checksum + checksum) % CHECKSUM_MODULUS
+
+def row_checksum_sql(*columns) -> str:
+    """То же выражением SQL над колонками (остаток в SQLite бывает отрицательным, поэтому + модуль)"""
+    m, f = CHECKSUM_MODULUS, CHECKSUM_FACTOR
+    checksum = "0"
+    for column in columns:
+        checksum = f"(({checksum}) * {f} + ((({column}) % {m}) + {m}) % {m}) % {m}"
+    return f"((({checksum}) * ({checksum}) + ({checksum})) % {m})"
+
+def add_fingerprint(fingerprint: dict, group, *values):
+    """Учесть строку в отпечатке {группа: (число строк, сумма row_checksum)}"""
+    count, total = fingerprint.get(group, (0, 0))
+    fingerprint[group] = (count + 1, total + row_checksum(*values))
+
+def check_status(status):
+    """Проверить статус статистики (None - итога нет)"""
+    if status is not None and status not in STATUSES:
+        raise ValueError(f"Неизвестный статус статистики: {status}")
+
+def advance_streak(status: str, day: date, streak: int, best_streak: int, last_success_day: str):
+    """Серия успехов после итога status за день day: (streak, best_streak, last_success_day)"""
+    if status == 'success':
+        if last_success_day != day.isoformat() or streak == 0:
+            yesterday = (day - timedelta(days=1)).isoformat()
+            streak = streak + 1 if last_success_day == yesterday else 1
+            last_success_day = day.isoformat()
+        best_streak = max(best_streak, streak)
+    else:
+        streak = 0
+    return streak, best_streak, last_success_day
+
+def visible_streak(streak: int, last_success_day: str) -> int:
+    """Текущая серия для отчета: она прервана, если вчера и сегодня успешных подъемов не было"""
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    if not last_success_day or last_success_day < yesterday:
+        return 0
+    return streak
+
+class ConnectionPool:
+    """Долгоживущие соединения SQLite: один писатель и пул читателей.
+
+    База работает в режиме WAL, поэтому читатели не ждут писателя.
+    Соединения можно использовать из любого потока: писатель защищен блокировкой,
+    а читатель выдается потоку в монопольное пользование на время запроса.
+    """
+
+    def __init__(self, path: str, readers: int = DB_READER_POOL_SIZE):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._readers = queue.LifoQueue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Соединение писателя; транзакция фиксируется при выходе из блока"""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def read(self):
+        """Соединение читателя из пула"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        """Закрыть все соединения"""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
 class Database:
-    def __init__(self):
+    """Хранилище в SQLite (реализация storage.Storage)"""
+
+    blocking = True
+
+    def __init__(self, path: str = DATABASE_PATH):
+        self.pool = ConnectionPool(path)
         self.init_database()
 
     def init_database(self):
-        """Инициализация базы данных SQLite"""
-        conn = sqlite3.connect('alarm_bot.db')
-        cursor = conn.cursor()
-
-        # УДАЛЯЕМ старые таблицы если есть
-        cursor.execute("DROP TABLE IF EXISTS users")
-        cursor.execute("DROP TABLE IF EXISTS alarms")
-        cursor.execute("DROP TABLE IF EXISTS user_states")
-        cursor.execute("DROP TABLE IF EXISTS statistics")
-
-        # Таблица пользователей
-        cursor.execute('''
-            CREATE TABLE users (
-                user_id INTEGER PRIMARY KEY,
-                first_name TEXT,
-                username TEXT,
-                created_at TEXT
-            )
-        ''')
-
-        # Таблица будильников
-        cursor.execute('''
-            CREATE TABLE alarms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                time_start TEXT,
-                time_end TEXT,
-                random_wake_time TEXT,
-                last_activation_date TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TEXT
-            )
-        ''')
-
-        # Таблица состояний пользователей
-        cursor.execute('''
-            CREATE TABLE user_states (
-                user_id INTEGER PRIMARY KEY,
-                state TEXT DEFAULT 'SLEEP',
-                current_puzzle_question TEXT,
-                current_puzzle_answer TEXT,
-                puzzle_sent_at TEXT
-            )
-        ''')
-
-        # Таблица статистики
-        cursor.execute('''
-            CREATE TABLE statistics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                date TEXT,
-                status TEXT,
-                solve_time_1 INTEGER,
-                solve_time_2 INTEGER
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
-        logger.info("✅ База данных пересоздана с правильной структурой!")
+        """Привести схему базы данных SQLite к текущей версии"""
+        with self.pool.write() as conn:
+            version = migrate(conn)
+        logger.info(f"✅ База данных готова, версия схемы {version}")
 
-    def get_connection(self):
-        """Возвращает соединение с базой данных"""
-        return sqlite3.connect('alarm_bot.db')
+    def close(self):
+        """Закрыть соединения с базой данных"""
+        self.pool.close()
 
     def save_user(self, user_id: int, first_name: str, username: str):
         """Сохранить пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO users (user_id, first_name, username, created_at) VALUES (?, ?, ?, ?)",
-            (user_id, first_name, username, datetime.now().isoformat())
-        )
-        conn.commit()
-        conn.close()
+        with self.pool.write() as conn:
+            conn.execute(
+                """INSERT INTO users (user_id, first_name, username, created_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET first_name = excluded.first_name, username = excluded.username""",
+                (user_id, first_name, username, datetime.now().isoformat())
+            )
+
+    def get_timezone(self, user_id: int):
+        """Часовой пояс пользователя (имя IANA) или None, если он не выбран"""
+        with self.pool.read() as conn:
+            row = conn.execute("SELECT timezone FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_timezone(self, user_id: int, timezone: str):
+        """Сохранить часовой пояс пользователя"""
+        with self.pool.write() as conn:
+            conn.execute(
+                """INSERT INTO users (user_id, timezone, created_at) VALUES (?, ?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone""",
+                (user_id, timezone, datetime.now().isoformat())
+            )
 
     def get_user_state(self, user_id: int):
         """Получить состояние пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT state, current_puzzle_question, current_puzzle_answer FROM user_states WHERE user_id = ?",
-            (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with self.pool.read() as conn:
+            result = conn.execute(
+                "SELECT state, current_puzzle_question, current_puzzle_answer FROM user_states WHERE user_id = ?",
+                (user_id,)).fetchone()
 
         if result:
             return {
@@ -103,107 +217,475 @@ class Database:
             }
         return None
 
-    def set_user_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None):
-        """Установить состояние пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def set_user_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                       deadline_kind: str = None, deadline_at: int = None, outcome: str = None,
+                       solve_time_1: int = None, solve_time_2: int = None):
+        """Установить состояние пользователя (и его дедлайн, если есть).
+
+        Если передан outcome, в той же транзакции записывается итог пробуждения
+        вместе с временем решения головоломок в миллисекундах.
+        """
+        check_status(outcome)
+        with self.pool.write() as conn:
+            if outcome is not None:
+                self._insert_statistics(conn, user_id, outcome, solve_time_1, solve_time_2)
+            self._write_state(conn, user_id, state, puzzle_question, puzzle_answer, deadline_kind, deadline_at)
+
+    def write_batch(self, states, statistics, sketches=()):
+        """Записать одной транзакцией пачку состояний (аргументы set_user_state без итога),
+        итогов (user_id, status, solve_time_1, solve_time_2) и скетчей (scope, key, bytes)"""
+        with self.pool.write() as conn:
+            for args in states:
+                self._write_state(conn, *args)
+            for row in statistics:
+                self._insert_statistics(conn, *row)
+            conn.executemany("INSERT OR REPLACE INTO solve_sketches (scope, key, sketch) VALUES (?, ?, ?)", sketches)
 
+    def get_sketch(self, scope: str, key: str):
+        """Сохраненный скетч квантилей (bytes) или None"""
+        with self.pool.read() as conn:
+            row = conn.execute("SELECT sketch FROM solve_sketches WHERE scope = ? AND key = ?", (scope, key)).fetchone()
+        return row[0] if row else None
+
+    def get_sketches(self, scope: str):
+        """Все скетчи одного вида: список (key, bytes)"""
+        with self.pool.read() as conn:
+            return conn.execute("SELECT key, sketch FROM solve_sketches WHERE scope = ?", (scope,)).fetchall()
+
+    def _write_state(self, conn, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                     deadline_kind: str = None, deadline_at: int = None):
         if puzzle_question and puzzle_answer:
-            cursor.execute('''
+            conn.execute('''
                 INSERT OR REPLACE INTO user_states 
-                (user_id, state, current_puzzle_question, current_puzzle_answer, puzzle_sent_at) 
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, state, puzzle_question, puzzle_answer, datetime.now().isoformat()))
+                (user_id, state, current_puzzle_question, current_puzzle_answer, puzzle_sent_at, deadline_kind, deadline_at) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, state, puzzle_question, puzzle_answer, datetime.now().isoformat(), deadline_kind, deadline_at))
         else:
-            cursor.execute('''
+            conn.execute('''
                 INSERT OR REPLACE INTO user_states 
-                (user_id, state, puzzle_sent_at) 
-                VALUES (?, ?, ?)
-            ''', (user_id, state, datetime.now().isoformat()))
-
-        conn.commit()
-        conn.close()
+                (user_id, state, puzzle_sent_at, deadline_kind, deadline_at) 
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, state, datetime.now().isoformat(), deadline_kind, deadline_at))
 
-    def set_alarm(self, user_id: int, time_start: str, time_end: str):
-        """Установить будильник"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_active_sessions(self, shard_count: int = 1, shard_index: int = 0):
+        """Незавершенные сценарии пробуждения: список (user_id, state, question, answer, deadline_at, sent_at),
+        deadline_at - UTC epoch, sent_at - когда записано состояние (для головоломки - когда она отправлена)"""
+        shard_sql, shard_params = shard_clause(shard_count, shard_index)
+        with self.pool.read() as conn:
+            rows = conn.execute(
+                "SELECT user_id, state, current_puzzle_question, current_puzzle_answer, deadline_at, puzzle_sent_at "
+                "FROM user_states WHERE deadline_at IS NOT NULL" + shard_sql,
+                shard_params
+            ).fetchall()
+        return [(user_id, state, question, answer, deadline_at,
+                 datetime.fromisoformat(sent_at) if sent_at else None)
+                for user_id, state, question, answer, deadline_at, sent_at in rows]
 
-        # Удаляем старый будильник
-        cursor.execute("DELETE FROM alarms WHERE user_id = ?", (user_id,))
+    def get_fingerprints(self, shard_count: int = 1, shard_index: int = 0):
+        """Отпечатки будильников и незавершенных сценариев шарда для сверки со снимком планировщика.
 
-        # Создаем новый с дополнительными полями
-        cursor.execute(
-            "INSERT INTO alarms (user_id, time_start, time_end, random_wake_time, last_activation_date, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, time_start, time_end, None, None, datetime.now().isoformat())
+        Будильники группируются по часовому поясу (без выбранного - DEFAULT_TIMEZONE),
+        сценарии - по состоянию; в группе (число строк, сумма row_checksum):
+        будильник - (user_id, next_fire_at, start_minute, end_minute), сценарий - (user_id,).
+        """
+        shard_sql, shard_params = shard_clause(shard_count, shard_index)
+        with self.pool.read() as conn:
+            alarms = conn.execute(
+                "SELECT COALESCE(users.timezone, ?), COUNT(*), "
+                f"SUM({row_checksum_sql('user_id', 'COALESCE(next_fire_at, -1)', 'start_minute', 'end_minute')}) "
+                "FROM alarms LEFT JOIN users USING (user_id) WHERE TRUE" + shard_sql + " GROUP BY 1",
+                (DEFAULT_TIMEZONE, *shard_params)
+            ).fetchall()
+            sessions = conn.execute(
+                f"SELECT state, COUNT(*), SUM({row_checksum_sql('user_id')}) "
+                "FROM user_states WHERE deadline_at IS NOT NULL" + shard_sql + " GROUP BY state",
+                shard_params
+            ).fetchall()
+        return (
+            {zone: (count, total) for zone, count, total in alarms},
+            {state: (count, total) for state, count, total in sessions},
         )
 
-        conn.commit()
-        conn.close()
-        logger.info(f"Будильник установлен для пользователя {user_id}: {time_start} - {time_end}")
-
-    def get_active_alarms(self):
-        """Получить все активные будильники"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_id, time_start, time_end, random_wake_time, last_activation_date FROM alarms WHERE is_active = TRUE")
-        alarms = cursor.fetchall()
-        conn.close()
-        return alarms
-
-    def update_alarm_wake_time(self, user_id: int, wake_time: str, activation_date: str):
+    def set_alarm(self, user_id: int, start_minute: int, end_minute: int, wake_minute: int, next_fire_at: int):
+        """Установить будильник: окно в минутах от начала суток и ближайшее срабатывание (UTC epoch)"""
+        with self.pool.write() as conn:
+            # Один будильник на пользователя: новый интервал заменяет старый
+            conn.execute('''
+                INSERT INTO alarms (user_id, start_minute, end_minute, wake_minute, next_fire_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    start_minute = excluded.start_minute,
+                    end_minute = excluded.end_minute,
+                    wake_minute = excluded.wake_minute,
+                    next_fire_at = excluded.next_fire_at,
+                    created_at = excluded.created_at
+            ''', (user_id, start_minute, end_minute, wake_minute, next_fire_at, datetime.now().isoformat()))
+
+        logger.info(f"Будильник установлен для пользователя {user_id}: минуты {start_minute} - {end_minute}")
+
+    def get_active_alarms(self, shard_count: int = 1, shard_index: int = 0):
+        """Все будильники (или будильники одного шарда) по возрастанию next_fire_at:
+        (user_id, start_minute, end_minute, wake_minute, next_fire_at, timezone)"""
+        shard_sql, shard_params = shard_clause(shard_count, shard_index)
+        with self.pool.read() as conn:
+            return conn.execute(
+                "SELECT user_id, start_minute, end_minute, wake_minute, next_fire_at, users.timezone "
+                "FROM alarms LEFT JOIN users USING (user_id) WHERE TRUE" + shard_sql + " ORDER BY next_fire_at",
+                shard_params
+            ).fetchall()
+
+    def update_alarm_wake_time(self, user_id: int, wake_minute: int, next_fire_at: int):
         """Обновить время пробуждения будильника"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE alarms SET random_wake_time = ?, last_activation_date = ? WHERE user_id = ?",
-            (wake_time, activation_date, user_id)
+        with self.pool.write() as conn:
+            conn.execute(
+                "UPDATE alarms SET wake_minute = ?, next_fire_at = ? WHERE user_id = ?",
+                (wake_minute, next_fire_at, user_id)
+            )
+
+    def update_alarm_wake_times(self, wake_times):
+        """Обновить время пробуждения пачки будильников одной транзакцией: (user_id, wake_minute, next_fire_at)"""
+        with self.pool.write() as conn:
+            conn.executemany(
+                "UPDATE alarms SET wake_minute = ?, next_fire_at = ? WHERE user_id = ?",
+                ((wake_minute, next_fire_at, user_id) for user_id, wake_minute, next_fire_at in wake_times)
+            )
+
+    def add_statistics(self, user_id: int, status: str, solve_time_1: int = None, solve_time_2: int = None):
+        """Добавить запись в статистику и обновить накопительные счетчики"""
+        check_status(status)
+
+        with self.pool.write() as conn:
+            self._insert_statistics(conn, user_id, status, solve_time_1, solve_time_2)
+
+    def _insert_statistics(self, conn, user_id: int, status: str, solve_time_1: int = None, solve_time_2: int = None):
+        now = datetime.now()
+        conn.execute(
+            "INSERT INTO statistics (user_id, date, status, solve_time_1, solve_time_2) VALUES (?, ?, ?, ?, ?)",
+            (user_id, now.isoformat(), status, solve_time_1, solve_time_2)
         )
-        conn.commit()
-        conn.close()
-
-    def deactivate_alarm(self, user_id: int):
-        """Деактивировать будильник"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE alarms SET is_active = FALSE WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
-
-    def reset_all_alarms(self):
-        """Активировать все будильники (ежедневный сброс)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE alarms SET is_active = TRUE, random_wake_time = NULL")
-        conn.commit()
-        conn.close()
-        logger.info("Все будильники сброшены на активное состояние")
-
-    def add_statistics(self, user_id: int, status: str):
-        """Добавить запись в статистику"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO statistics (user_id, date, status) VALUES (?, ?, ?)",
-            (user_id, datetime.now().isoformat(), status)
+        self._update_rollup(conn, user_id, status, now.date())
+
+    def _update_rollup(self, conn, user_id: int, status: str, day: date):
+        """Увеличить дневной и общий счетчики статуса и пересчитать серию успехов"""
+        conn.execute(
+            f"INSERT INTO daily_stats (user_id, day, {status}) VALUES (?, ?, 1) "
+            f"ON CONFLICT (user_id, day) DO UPDATE SET {status} = {status} + 1",
+            (user_id, day.isoformat())
         )
-        conn.commit()
-        conn.close()
-
-    def get_statistics(self, user_id: int):
-        """Получить статистику пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT status FROM statistics WHERE user_id = ? ORDER BY date DESC LIMIT 7",
+
+        row = conn.execute(
+            "SELECT current_streak, best_streak, last_success_day FROM user_stats WHERE user_id = ?",
             (user_id,)
+        ).fetchone()
+        streak, best_streak, last_success_day = advance_streak(status, day, *(row or (0, 0, None)))
+
+        conn.execute(
+            f"INSERT INTO user_stats (user_id, {status}, current_streak, best_streak, last_success_day) "
+            f"VALUES (?, 1, ?, ?, ?) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {status} = {status} + 1, "
+            f"current_streak = excluded.current_streak, best_streak = excluded.best_streak, "
+            f"last_success_day = excluded.last_success_day",
+            (user_id, streak, best_streak, last_success_day)
         )
-        results = cursor.fetchall()
-        conn.close()
 
-        success = len([r for r in results if r[0] == 'success'])
-        failed_first = len([r for r in results if r[0] == 'failed_first'])
-        failed_second = len([r for r in results if r[0] == 'failed_second'])
+    def export_rows(self, table: str, fetch_size: int = EXPORT_FETCH_SIZE):
+        """Построчно выгрузить таблицу: кортежи в порядке TRANSFER_COLUMNS[table].
+
+        Строки читаются с курсора порциями по fetch_size, поэтому память не зависит
+        от размера таблицы. Читающее соединение занято, пока генератор не исчерпан или не закрыт.
+        """
+        columns = ", ".join(name for name, _ in TRANSFER_COLUMNS[table])
+        with self.pool.read() as conn:
+            cursor = conn.execute(f"SELECT {columns} FROM {table}")
+            try:
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def import_rows(self, table: str, rows, batch_size: int = IMPORT_BATCH_SIZE, on_commit=None) -> int:
+        """Загрузить строки (кортежи в порядке TRANSFER_COLUMNS[table]) пачками по batch_size.
+
+        Каждая пачка - своя транзакция, так что уже загруженное не откатывается при ошибке
+        в следующей. Для statistics заодно растут накопительные счетчики (серии, как и при
+        миграции 4, не пересчитываются). on_commit(всего строк) вызывается после каждой пачки.
+        """
+        sql = IMPORT_SQL[table]
+        rows = iter(rows)
+        total = 0
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return total
+            with self.pool.write() as conn:
+                conn.executemany(sql, batch)
+                if table == 'statistics':
+                    self._add_imported_statistics(conn, batch)
+            total += len(batch)
+            if on_commit:
+                on_commit(total)
+
+    def _add_imported_statistics(self, conn, batch):
+        counts = Counter()
+        for user_id, moment, status, _, _ in batch:
+            if status not in STATUSES:
+                raise ValueError(f"Неизвестный статус статистики: {status}")
+            counts[user_id, moment[:10], status] += 1
+
+        for status in STATUSES:
+            daily = [(user_id, day, count) for (user_id, day, row_status), count in counts.items() if row_status == status]
+            conn.executemany(
+                f"INSERT INTO daily_stats (user_id, day, {status}) VALUES (?, ?, ?) "
+                f"ON CONFLICT (user_id, day) DO UPDATE SET {status} = {status} + excluded.{status}",
+                daily
+            )
+            totals = Counter()
+            for user_id, _, count in daily:
+                totals[user_id] += count
+            conn.executemany(
+                f"INSERT INTO user_stats (user_id, {status}) VALUES (?, ?) "
+                f"ON CONFLICT (user_id) DO UPDATE SET {status} = {status} + excluded.{status}",
+                totals.items()
+            )
+
+    def get_statistics(self, user_id: int, days: int = 7):
+        """Получить статистику пользователя за последние days дней (None - за все время)"""
+        with self.pool.read() as conn:
+            return self._count_statuses(conn, user_id, days)
+
+    def get_statistics_report(self, user_id: int):
+        """Статистика за неделю, месяц и все время плюс серия успешных подъемов"""
+        with self.pool.read() as conn:
+            report = {
+                'week': self._count_statuses(conn, user_id, 7),
+                'month': self._count_statuses(conn, user_id, 30),
+                'total': self._count_statuses(conn, user_id, None),
+            }
+            row = conn.execute(
+                "SELECT current_streak, best_streak, last_success_day FROM user_stats WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+
+        streak, best_streak, last_success_day = row or (0, 0, None)
+        report['streak'] = visible_streak(streak, last_success_day)
+        report['best_streak'] = best_streak
+        return report
+
+    def _count_statuses(self, conn, user_id: int, days):
+        if days is None:
+            row = conn.execute(
+                "SELECT success, failed_first, failed_second FROM user_stats WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        else:
+            since = (date.today() - timedelta(days=days - 1)).isoformat()
+            row = conn.execute(
+                "SELECT SUM(success), SUM(failed_first), SUM(failed_second) FROM daily_stats "
+                "WHERE user_id = ? AND day >= ?",
+                (user_id, since)
+            ).fetchone()
+
+        success, failed_first, failed_second = row or (0, 0, 0)
+        return success or 0, failed_first or 0, failed_second or 0
+
+class AsyncDatabase:
+    """Асинхронный доступ к хранилищу (storage.Storage) без блокировки цикла событий.
+
+    Записи в блокирующее хранилище выполняются по очереди в отдельном потоке
+    писателя, чтения - в пуле потоков размером с пул читающих соединений.
+    Неблокирующее хранилище (в памяти) вызывается прямо в цикле событий.
+    Отдельного кеша состояний нет: живые сценарии держит в памяти
+    wake_flow.WakeFlow, а get_user_state нужен только для разовых чтений.
+
+    set_user_state, add_statistics и save_sketch пишутся отложенно: записи копятся в буфере
+    и сбрасываются одной транзакцией раз в WRITE_FLUSH_INTERVAL секунд или как
+    только наберется WRITE_BATCH_SIZE записей. Из нескольких состояний одного
+    пользователя (и одного скетча) в буфере остается последнее. Чтения того же
+    пользователя видят еще не записанное: состояние и скетч берутся из буфера,
+    а статистика перед чтением сбрасывается. При остановке нужно дождаться flush() и вызвать close().
+    """
+
+    def __init__(self, storage):
+        self.sync = storage
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=DB_READER_POOL_SIZE, thread_name_prefix="db-reader")
+        self._states = {}          # user_id -> аргументы Database._write_state, ждут записи
+        self._flushing = {}        # то же, но уже отправлено писателю
+        self._statistics = []      # (user_id, status, solve_time_1, solve_time_2), ждут записи
+        self._dirty_stats = set()  # пользователи, чья статистика еще не в базе
+        self._sketches = {}        # (scope, key) -> bytes, ждут записи
+        self._flushing_sketches = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._flush_timer = None
+
+    async def _run(self, executor, method, *args):
+        if not self.sync.blocking:
+            return self._timed(method, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self._timed, method, *args))
+
+    @staticmethod
+    def _timed(method, *args):
+        # Меряется сам запрос в потоке, без ожидания в очереди исполнителя
+        with DB_LATENCY.time(method.__name__):
+            return method(*args)
+
+    async def save_user(self, user_id: int, first_name: str, username: str):
+        await self._run(self._writer, self.sync.save_user, user_id, first_name, username)
+
+    async def get_timezone(self, user_id: int):
+        return await self._run(self._readers, self.sync.get_timezone, user_id)
+
+    async def set_timezone(self, user_id: int, timezone: str):
+        await self._run(self._writer, self.sync.set_timezone, user_id, timezone)
+
+    async def get_user_state(self, user_id: int):
+        pending = self._states.get(user_id) or self._flushing.get(user_id)
+        if pending:
+            return self._state_row(*pending)
+        return await self._run(self._readers, self.sync.get_user_state, user_id)
+
+    async def set_user_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                             deadline_kind: str = None, deadline_at: int = None, outcome: str = None,
+                             solve_time_1: int = None, solve_time_2: int = None):
+        check_status(outcome)
+        args = (user_id, state, puzzle_question, puzzle_answer, deadline_kind, deadline_at)
+        self._states[user_id] = args
+        if outcome is not None:
+            self._statistics.append((user_id, outcome, solve_time_1, solve_time_2))
+            self._dirty_stats.add(user_id)
+        self._schedule_flush()
+
+    @staticmethod
+    def _state_row(user_id, state, puzzle_question, puzzle_answer, deadline_kind, deadline_at):
+        has_puzzle = bool(puzzle_question and puzzle_answer)
+        return {
+            'state': state,
+            'current_puzzle_question': puzzle_question if has_puzzle else None,
+            'current_puzzle_answer': puzzle_answer if has_puzzle else None
+        }
+
+    async def get_active_sessions(self, shard_count: int = 1, shard_index: int = 0):
+        await self.flush()
+        return await self._run(self._readers, self.sync.get_active_sessions, shard_count, shard_index)
+
+    async def get_fingerprints(self, shard_count: int = 1, shard_index: int = 0):
+        await self.flush()
+        return await self._run(self._readers, self.sync.get_fingerprints, shard_count, shard_index)
+
+    async def set_alarm(self, user_id: int, start_minute: int, end_minute: int, wake_minute: int, next_fire_at: int):
+        await self._run(self._writer, self.sync.set_alarm, user_id, start_minute, end_minute, wake_minute, next_fire_at)
+
+    async def get_active_alarms(self, shard_count: int = 1, shard_index: int = 0):
+        return await self._run(self._readers, self.sync.get_active_alarms, shard_count, shard_index)
+
+    async def update_alarm_wake_time(self, user_id: int, wake_minute: int, next_fire_at: int):
+        await self._run(self._writer, self.sync.update_alarm_wake_time, user_id, wake_minute, next_fire_at)
+
+    async def update_alarm_wake_times(self, wake_times):
+        await self._run(self._writer, self.sync.update_alarm_wake_times, list(wake_times))
+
+    async def add_statistics(self, user_id: int, status: str, solve_time_1: int = None, solve_time_2: int = None):
+        check_status(status)
+        self._statistics.append((user_id, status, solve_time_1, solve_time_2))
+        self._dirty_stats.add(user_id)
+        self._schedule_flush()
+
+    async def get_sketch(self, scope: str, key: str):
+        pending = self._sketches.get((scope, key)) or self._flushing_sketches.get((scope, key))
+        if pending:
+            return pending
+        return await self._run(self._readers, self.sync.get_sketch, scope, key)
+
+    async def get_sketches(self, scope: str):
+        await self.flush()
+        return await self._run(self._readers, self.sync.get_sketches, scope)
+
+    async def save_sketch(self, scope: str, key: str, sketch: bytes):
+        self._sketches[scope, key] = sketch
+        self._schedule_flush()
+
+    async def get_statistics(self, user_id: int, days: int = 7):
+        if user_id in self._dirty_stats:
+            await self.flush()
+        return await self._run(self._readers, self.sync.get_statistics, user_id, days)
+
+    async def get_statistics_report(self, user_id: int):
+        if user_id in self._dirty_stats:
+            await self.flush()
+        return await self._run(self._readers, self.sync.get_statistics_report, user_id)
+
+    @property
+    def pending_writes(self) -> int:
+        """Сколько отложенных записей еще не в базе"""
+        return (len(self._states) + len(self._flushing) + len(self._statistics)
+                + len(self._sketches) + len(self._flushing_sketches))
+
+    def _has_pending(self) -> bool:
+        return bool(self._states or self._statistics or self._sketches)
+
+    async def flush(self) -> bool:
+        """Записать накопленное одной транзакцией; False, если запись не удалась и повторится позже"""
+        async with self._flush_lock:
+            if not self._has_pending():
+                return True
+            self._flushing, self._states = self._states, {}
+            self._flushing_sketches, self._sketches = self._sketches, {}
+            statistics, self._statistics = self._statistics, []
+            try:
+                await self._run(self._writer, self.sync.write_batch, list(self._flushing.values()), statistics,
+                                [(scope, key, sketch) for (scope, key), sketch in self._flushing_sketches.items()])
+            except Exception as e:
+                # Возвращаем пачку в буфер: более новые состояния и скетчи из буфера важнее, статистика идет первой
+                for user_id, args in self._flushing.items():
+                    self._states.setdefault(user_id, args)
+                for key, sketch in self._flushing_sketches.items():
+                    self._sketches.setdefault(key, sketch)
+                self._statistics[:0] = statistics
+                failed = len(self._flushing) + len(self._flushing_sketches) + len(statistics)
+                logger.error(f"❌ Не удалось записать {failed} отложенных записей: {e}")
+                return False
+            finally:
+                self._flushing, self._flushing_sketches = {}, {}
+            self._dirty_stats = {row[0] for row in self._statistics}
+            return True
+
+    def _schedule_flush(self, delay: float = WRITE_FLUSH_INTERVAL):
+        if self._flush_task:
+            return  # запущенный сброс сам запланирует следующий
+        if len(self._states) + len(self._statistics) + len(self._sketches) >= WRITE_BATCH_SIZE:
+            self._start_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_in_background())
+
+    async def _flush_in_background(self):
+        try:
+            written = await self.flush()
+        finally:
+            self._flush_task = None
+        if self._has_pending():
+            self._schedule_flush(WRITE_FLUSH_INTERVAL if written else WRITE_RETRY_INTERVAL)
 
-        return success, failed_first, failed_second
\ No newline at end of file
+    def close(self):
+        """Дождаться незавершенных запросов, дописать отложенное и закрыть соединения"""
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        if self._has_pending():
+            logger.warning(f"Дописываю {self.pending_writes} отложенных записей при закрытии")
+            self.sync.write_batch(list(self._states.values()), self._statistics,
+                                  [(scope, key, sketch) for (scope, key), sketch in self._sketches.items()])
+            self._states, self._statistics, self._sketches = {}, [], {}
+        self.sync.close()
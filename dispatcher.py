@@ -0,0 +1,107 @@
+import asyncio
+from collections import deque
+
+from telegram.error import RetryAfter, TelegramError
+
+from config import logger, OUTBOUND_RATE, OUTBOUND_BURST, CHAT_SEND_INTERVAL
+from metrics import SEND_LATENCY, SEND_FAILURES
+
+
+class TokenBucket:
+    """Ведро токенов: в среднем не больше rate событий в секунду, всплеск до burst"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = None
+
+    def reserve(self, now: float) -> float:
+        """Забрать токен и вернуть, сколько секунд нужно подождать до его появления"""
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self):
+        """Дождаться своего токена"""
+        delay = self.reserve(asyncio.get_running_loop().time())
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class MessageDispatcher:
+    """Очередь исходящих сообщений с глобальным лимитом и темпом на каждый чат.
+
+    Каждый чат обслуживает своя задача, поэтому сообщения одному пользователю
+    уходят строго по порядку, а разные пользователи получают их параллельно.
+    """
+
+    def __init__(self, rate: float = OUTBOUND_RATE, burst: float = OUTBOUND_BURST,
+                 chat_interval: float = CHAT_SEND_INTERVAL):
+        self.bot = None
+        self._global = TokenBucket(rate, burst)
+        self._chat_interval = chat_interval
+        self._queues = {}   # chat_id -> deque[(text, kwargs, on_sent)]
+        self._workers = {}  # chat_id -> asyncio.Task
+        self._pending = 0
+
+    def start(self, bot):
+        """Привязать диспетчер к боту"""
+        self.bot = bot
+
+    @property
+    def queue_depth(self) -> int:
+        """Сколько сообщений ждет отправки"""
+        return self._pending
+
+    def send(self, chat_id: int, text: str, on_sent=None, **kwargs):
+        """Поставить сообщение в очередь чата, не дожидаясь отправки.
+
+        on_sent() вызывается сразу после успешной отправки.
+        """
+        self._queues.setdefault(chat_id, deque()).append((text, kwargs, on_sent))
+        self._pending += 1
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain_chat(chat_id))
+
+    async def drain(self, timeout: float = None):
+        """Дождаться отправки всех сообщений из очереди"""
+        if self._workers:
+            await asyncio.wait(list(self._workers.values()), timeout=timeout)
+
+    async def _drain_chat(self, chat_id: int):
+        messages = self._queues[chat_id]
+        pacing = TokenBucket(1 / self._chat_interval, 1)
+        loop = asyncio.get_running_loop()
+        try:
+            while messages:
+                text, kwargs, on_sent = messages[0]
+                delay = pacing.reserve(loop.time())
+                if delay:
+                    await asyncio.sleep(delay)
+                await self._global.acquire()
+                if await self._deliver(chat_id, text, kwargs) and on_sent:
+                    on_sent()
+                messages.popleft()
+                self._pending -= 1
+        finally:
+            self._pending -= len(messages)
+            del self._queues[chat_id]
+            del self._workers[chat_id]
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict) -> bool:
+        while True:
+            try:
+                with SEND_LATENCY.time():
+                    await self.bot.send_message(chat_id, text, **kwargs)
+                return True
+            except RetryAfter as e:
+                SEND_FAILURES.inc("retry_after")
+                logger.warning(f"Telegram просит подождать {e.retry_after} с перед отправкой {chat_id}")
+                await asyncio.sleep(e.retry_after)
+            except TelegramError as e:
+                SEND_FAILURES.inc(type(e).__name__)
+                logger.error(f"Не удалось отправить сообщение {chat_id}: {e}")
+                return False
@@ -1,36 +1,74 @@
-import asyncio
 import random
-from datetime import datetime, timedelta
+import time
+from functools import lru_cache
+from datetime import datetime
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from database import Database
+from database import AsyncDatabase
 from puzzles import get_random_puzzle, validate_answer
 from keyboards import MAIN_KEYBOARD
-from config import logger
-
-# Инициализация базы данных
-db = Database()
+from config import (
+    OUTBOUND_RATE, OUTBOUND_BURST, SHARD_COUNT, SHARD_INDEX, ADMIN_IDS, DEFAULT_TIMEZONE
+)
+from scheduler import (
+    AlarmScheduler, TimerQueue, MINUTES_PER_DAY, first_fire_at, parse_zone, user_zone
+)
+from dispatcher import MessageDispatcher
+from wake_flow import WakeFlow, WakeEvent, ANSWER_STATES
+from solve_times import SolveTimes
+from profiling import profiled, profiler
+
+# Планировщик будильников (заполняется из таблицы alarms при запуске)
+scheduler = AlarmScheduler()
+
+# Дедлайны головоломок: не больше одного на пользователя, копия хранится в user_states
+deadlines = TimerQueue()
+
+# Очередь исходящих сообщений, которые бот шлет сам (будильники, головоломки, таймауты).
+# Лимит Telegram общий для бота, поэтому шарды делят его поровну.
+dispatcher = MessageDispatcher(rate=OUTBOUND_RATE / SHARD_COUNT, burst=max(1, OUTBOUND_BURST // SHARD_COUNT))
+
+# Хранилище, время решения головоломок и сценарий пробуждения (незавершенные
+# сессии пользователей в памяти) создаются при запуске в use_storage()
+db = None
+solve_times = None
+wake_flow = None
 
 # Временное хранилище для примеров головоломок
 user_example_puzzles = {}
 
-def generate_random_wake_time(start_str: str, end_str: str) -> str:
-    """Генерирует случайное время между start и end"""
-    start = datetime.strptime(start_str, "%H:%M")
-    end = datetime.strptime(end_str, "%H:%M")
-
-    # Разница в минутах
-    total_minutes = int((end - start).total_seconds() / 60)
-    random_minutes = random.randint(0, total_minutes)
-
-    wake_time = start + timedelta(minutes=random_minutes)
-    return wake_time.strftime("%H:%M")
+def use_storage(storage):
+    """Подключить хранилище (storage.Storage) к обработчикам; возвращает его асинхронную обертку"""
+    global db, solve_times, wake_flow
+    db = AsyncDatabase(storage)
+    solve_times = SolveTimes(db)
+    wake_flow = WakeFlow(db, deadlines, dispatcher.send, solve_times)
+    return db
+
+@lru_cache(maxsize=None)
+def parse_minutes(time_str: str) -> int:
+    """Переводит 'ЧЧ:ММ' в минуту от начала суток"""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def generate_random_wake_time(start_minute: int, end_minute: int) -> int:
+    """Генерирует случайную минуту суток между start и end (окно может переходить через полночь)"""
+    random_minutes = random.randint(0, (end_minute - start_minute) % MINUTES_PER_DAY)
+    return (start_minute + random_minutes) % MINUTES_PER_DAY
+
+def generate_wake_times(windows) -> list:
+    """Генерирует время пробуждения для пачки окон (start_minute, end_minute) за один проход"""
+    randrange = random.randrange
+    return [
+        (start + randrange((end - start) % MINUTES_PER_DAY + 1)) % MINUTES_PER_DAY
+        for start, end in windows
+    ]
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user = update.effective_user
-    db.save_user(user.id, user.first_name, user.username)
+    await db.save_user(user.id, user.first_name, user.username)
 
     await update.message.reply_text(
         f"Привет, {user.first_name}! Я бот 'Доброе утро' - умный будильник с головоломками!",
@@ -59,11 +97,18 @@ async def handle_alarm_setup(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Проверяем формат времени
         datetime.strptime(start_str.strip(), "%H:%M")
         datetime.strptime(end_str.strip(), "%H:%M")
+        start_minute = parse_minutes(start_str.strip())
+        end_minute = parse_minutes(end_str.strip())
 
-        db.set_alarm(user_id, start_str.strip(), end_str.strip())
+        # Сразу выбираем время пробуждения: сегодня, если оно еще не прошло, иначе завтра
+        zone = user_zone(await db.get_timezone(user_id))
+        wake_minute = generate_random_wake_time(start_minute, end_minute)
+        fire_at = first_fire_at(start_minute, end_minute, wake_minute, zone, int(time.time()))
+        await db.set_alarm(user_id, start_minute, end_minute, wake_minute, fire_at)
+        scheduler.schedule_alarm(user_id, fire_at, (start_minute, end_minute, zone))
 
         await update.message.reply_text(
-            f"✅ Будильник установлен на интервал {start_str} - {end_str}\nПриятных снов! 🌙",
+            f"✅ Будильник установлен на интервал {start_str} - {end_str} ({zone.key})\nПриятных снов! 🌙",
             reply_markup=MAIN_KEYBOARD
         )
 
@@ -72,18 +117,38 @@ async def handle_alarm_setup(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "❌ Неверный формат. Введи в формате: ЧЧ:ММ - ЧЧ:ММ\nНапример: 7:00 - 7:30"
         )
 
+def seconds_text(seconds: float) -> str:
+    """'4.2 с', '35 с' или '2 мин 10 с'"""
+    if seconds < 10:
+        return f"{seconds:.1f} с"
+    if seconds < 90:
+        return f"{seconds:.0f} с"
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes} мин {seconds} с"
+
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать статистику пользователя"""
     user_id = update.effective_user.id
-    success, failed_first, failed_second = db.get_statistics(user_id)
+    report = await db.get_statistics_report(user_id)
+    solving = await solve_times.user_summary(user_id)
+    success, failed_first, failed_second = report['week']
+    month_success, month_failed_first, month_failed_second = report['month']
+    total_success, total_failed_first, total_failed_second = report['total']
 
     text = (
         f"📊 Твоя статистика за последние 7 дней:\n\n"
         f"✅ Успешных подъемов: {success}\n"
         f"❌ Не решил первую: {failed_first}\n"
         f"❌ Не решил вторую: {failed_second}\n\n"
-        f"Продолжай в том же духе! 💪"
+        f"📅 За 30 дней: ✅ {month_success} / ❌ {month_failed_first + month_failed_second}\n"
+        f"🏆 За все время: ✅ {total_success} / ❌ {total_failed_first + total_failed_second}\n"
+        f"🔥 Серия подъемов подряд: {report['streak']} (рекорд {report['best_streak']})\n\n"
     )
+    if solving:
+        solved, median, slow = solving
+        text += (f"⏱ Время решения: обычно {seconds_text(median)}, "
+                 f"в 9 из 10 раз до {seconds_text(slow)} ({solved} решено)\n\n")
+    text += "Продолжай в том же духе! 💪"
 
     await update.message.reply_text(text)
 
@@ -113,29 +178,62 @@ async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "3. Реши первую головоломку за 10 минут\n"
         "4. Через 10 минут реши вторую головоломку за 7 минут\n"
         "5. Получи статус 'Успешный подъем'! ✅\n\n"
+        f"Время считается по часовому поясу {DEFAULT_TIMEZONE}, свой можно выбрать командой "
+        "/timezone, например: /timezone Europe/Berlin\n\n"
         "Начни с кнопки 'Установить будильник'!"
     )
     await update.message.reply_text(help_text)
 
-async def handle_puzzle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, user_state: dict):
-    """Обработка ответа на головоломку"""
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /timezone Область/Город - выбрать часовой пояс будильника"""
     user_id = update.effective_user.id
-    user_answer = update.message.text.strip()
+    if not context.args:
+        current = user_zone(await db.get_timezone(user_id))
+        await update.message.reply_text(
+            f"🌍 Твой часовой пояс: {current.key}\nЧтобы сменить, напиши например: /timezone Europe/Berlin"
+        )
+        return
 
-    # Проверяем ответ
-    if validate_answer(user_answer, user_state['current_puzzle_answer']):
-        if user_state['state'] == 'AWAITING_FIRST_PUZZLE':
-            db.set_user_state(user_id, 'AWAITING_SECOND_PUZZLE')
-            await update.message.reply_text("✅ Верно! Жди вторую головоломку через 10 минут!")
-
-            # Запускаем вторую головоломку через 10 минут
-            asyncio.create_task(send_delayed_second_puzzle(user_id, context))
-
-        else:  # AWAITING_SECOND_RESPONSE
-            db.set_user_state(user_id, 'SLEEP')
-            db.add_statistics(user_id, 'success')
-            await update.message.reply_text("🎉 Поздравляю! Ты официально проснулся! Хорошего дня! 🌞",
-                                            reply_markup=MAIN_KEYBOARD)
+    zone = parse_zone(context.args[0])
+    if zone is None:
+        await update.message.reply_text("❌ Не знаю такого часового пояса. Пример: /timezone Asia/Yekaterinburg")
+        return
+
+    await db.set_timezone(user_id, zone.key)
+
+    # Уже установленный будильник переносим в новый часовой пояс
+    entry = scheduler.get(user_id)
+    if entry:
+        start_minute, end_minute, _ = entry[1]
+        wake_minute = generate_random_wake_time(start_minute, end_minute)
+        fire_at = first_fire_at(start_minute, end_minute, wake_minute, zone, int(time.time()))
+        await db.update_alarm_wake_time(user_id, wake_minute, fire_at)
+        scheduler.schedule_alarm(user_id, fire_at, (start_minute, end_minute, zone))
+
+    await update.message.reply_text(f"✅ Часовой пояс: {zone.key}", reply_markup=MAIN_KEYBOARD)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Служебная команда /profile on|off|dump для администраторов"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    action = context.args[0] if context.args else ""
+    if action == "on":
+        profiler.enable()
+        await update.message.reply_text("🔬 Профилирование включено")
+    elif action == "off":
+        path = profiler.disable()
+        await update.message.reply_text(f"🔬 Профилирование выключено: {path}" if path else "🔬 Профилирование и так выключено")
+    elif action == "dump" and profiler.enabled:
+        await update.message.reply_text(f"🔬 Профили сохранены: {profiler.dump()}")
+    else:
+        state = "включено" if profiler.enabled else "выключено"
+        await update.message.reply_text(f"🔬 Профилирование {state}. Использование: /profile on|off|dump")
+
+async def handle_puzzle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    """Обработка ответа на головоломку"""
+    if validate_answer(update.message.text.strip(), session.answer):
+        await wake_flow.fire(update.effective_user.id, WakeEvent.CORRECT, reply=update.message.reply_text)
     else:
         await update.message.reply_text("❌ Неверно! Попробуй еще раз:")
 
@@ -166,15 +264,16 @@ async def handle_example_puzzle_answer(update: Update, context: ContextTypes.DEF
     if user_id in user_example_puzzles:
         del user_example_puzzles[user_id]
 
+@profiled
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Основной обработчик сообщений"""
     text = update.message.text
     user_id = update.effective_user.id
 
-    # Сначала проверяем состояние пользователя (решает головоломку)
-    user_state = db.get_user_state(user_id)
-    if user_state and user_state['state'] in ['AWAITING_FIRST_PUZZLE', 'AWAITING_SECOND_RESPONSE']:
-        await handle_puzzle_answer(update, context, user_state)
+    # Сначала проверяем, не решает ли пользователь головоломку
+    session = wake_flow.session(user_id)
+    if session is not None and session.state in ANSWER_STATES:
+        await handle_puzzle_answer(update, context, session)
         return
 
     # Потом проверяем, есть ли активный пример головоломки
@@ -201,49 +300,17 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=MAIN_KEYBOARD
         )
 
-async def send_puzzle_to_user(user_id: int, context: ContextTypes.DEFAULT_TYPE, is_second=False):
-    """Отправить головоломку пользователю"""
-    puzzle = get_random_puzzle()
-
-    db.set_user_state(
-        user_id,
-        'AWAITING_SECOND_RESPONSE' if is_second else 'AWAITING_FIRST_PUZZLE',
-        puzzle['question'],
-        puzzle['answer']
-    )
+@profiled
+async def send_puzzle_to_user(user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Начать сценарий пробуждения: отправить первую головоломку"""
+    await wake_flow.fire(user_id, WakeEvent.ALARM)
 
-    message_text = (
-        f"Тук-тук! 🚪\nТы проснулся точно???\nДокажи! Реши:\n\n{puzzle['question']}"
-        if is_second else
-        f"Доброе утро! ☀️\nПора просыпаться! Реши головоломку:\n\n{puzzle['question']}"
-    )
-
-    await context.bot.send_message(user_id, message_text)
-
-    # Запускаем таймер
-    from config import FIRST_PUZZLE_TIMEOUT, SECOND_PUZZLE_TIMEOUT
-    timeout = SECOND_PUZZLE_TIMEOUT if is_second else FIRST_PUZZLE_TIMEOUT
-    asyncio.create_task(puzzle_timeout(user_id, context, is_second, timeout))
-
-async def puzzle_timeout(user_id: int, context: ContextTypes.DEFAULT_TYPE, is_second: bool, timeout: int):
-    """Таймаут для головоломки"""
-    await asyncio.sleep(timeout)
-
-    user_state = db.get_user_state(user_id)
-    if user_state and user_state['state'] == ('AWAITING_SECOND_RESPONSE' if is_second else 'AWAITING_FIRST_PUZZLE'):
-        status = 'failed_second' if is_second else 'failed_first'
-        db.add_statistics(user_id, status)
-        db.set_user_state(user_id, 'SLEEP')
-
-        message = (
-            "Время вышло! Подъем не подтвержден 😔"
-            if is_second else
-            "Время вышло! Сегодня не получилось проснуться вовремя 😔"
-        )
-        await context.bot.send_message(user_id, message, reply_markup=MAIN_KEYBOARD)
+@profiled
+async def handle_deadline(user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Дедлайн текущего состояния: вторая головоломка или таймаут"""
+    await wake_flow.fire(user_id, WakeEvent.DEADLINE)
 
-async def send_delayed_second_puzzle(user_id: int, context: ContextTypes.DEFAULT_TYPE):
-    """Отправить вторую головоломку через 10 минут"""
-    from config import DELAY_BETWEEN_PUZZLES
-    await asyncio.sleep(DELAY_BETWEEN_PUZZLES)
-    await send_puzzle_to_user(user_id, context, is_second=True)
\ No newline at end of file
+async def load_sessions():
+    """Восстановить незавершенные сценарии пробуждения и скетчи времени решения из базы после перезапуска"""
+    await wake_flow.load(SHARD_COUNT, SHARD_INDEX)
+    await solve_times.load()
@@ -0,0 +1,348 @@
+"""Нагрузочный тест бота на локальной подмене Telegram Bot API.
+
+Поднимает фейковый Bot API (getUpdates/sendMessage/setWebhook), запускает бота
+отдельным процессом и прогоняет синтетических пользователей через /start,
+установку будильника, срабатывание и решение обеих головоломок.
+
+    python loadtest.py --users 1000
+    python loadtest.py --users 50000 --spread 5 --output loadtest.json
+
+Сеть не нужна: все работает на 127.0.0.1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+
+BOT_TOKEN = "123456:loadtest"
+
+
+def percentile(values, fraction: float):
+    """Перцентиль по ближайшему рангу или None для пустой выборки"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FakeBotAPI:
+    """Минимальная подмена Bot API поверх asyncio: хватает для polling-режима бота"""
+
+    def __init__(self):
+        self.updates = []
+        self.next_update_id = 1
+        self.new_updates = asyncio.Event()
+        self.polling = asyncio.Event()
+        self.inboxes = {}    # chat_id -> asyncio.Queue[(monotonic, text)]
+        self.sent_at = []    # моменты всех sendMessage
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        server = await asyncio.start_server(self._serve, host, port)
+        return server, server.sockets[0].getsockname()[1]
+
+    def push_message(self, user_id: int, text: str) -> float:
+        """Положить входящее сообщение пользователя в очередь getUpdates"""
+        message = {
+            "message_id": self.next_update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+
+        self.updates.append({"update_id": self.next_update_id, "message": message})
+        self.next_update_id += 1
+        self.new_updates.set()
+        return time.monotonic()
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        return self.inboxes.setdefault(chat_id, asyncio.Queue())
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                method = request_line.split()[1].decode().rsplit("/", 1)[-1]
+                result = await self._call(method, self._parse_params(headers, body))
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(payload) + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_params(headers: dict, body: bytes) -> dict:
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    async def _call(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Доброе утро", "username": "loadtest_bot"}
+        if method == "getUpdates":
+            return await self._get_updates(int(params.get("offset", 0)), float(params.get("timeout", 0)))
+        if method == "sendMessage":
+            chat_id = int(params["chat_id"])
+            now = time.monotonic()
+            self.sent_at.append(now)
+            self.inbox(chat_id).put_nowait((now, params.get("text", "")))
+            return {
+                "message_id": len(self.sent_at),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        # setWebhook, deleteWebhook и прочее просто подтверждаем
+        return True
+
+    async def _get_updates(self, offset: int, timeout: float):
+        self.polling.set()
+        if offset:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:100]
+
+
+class SyntheticUser:
+    """Пользователь, который общается с ботом через фейковый API"""
+
+    def __init__(self, user_id: int, api: FakeBotAPI, timeout: float):
+        self.user_id = user_id
+        self.api = api
+        self.timeout = timeout
+        self.inbox = api.inbox(user_id)
+
+    def say(self, text: str) -> float:
+        return self.api.push_message(self.user_id, text)
+
+    async def expect(self, predicate):
+        """Дождаться сообщения бота, подходящего под условие; остальные пропускаются"""
+        while True:
+            received_at, text = await asyncio.wait_for(self.inbox.get(), self.timeout)
+            if predicate(text):
+                return received_at, text
+
+
+class AnswerReader:
+    """Ответы на головоломки из базы бота.
+
+    Бот пишет состояния отложенно, поэтому строка в user_states может появиться
+    позже сообщения: ждем, пока сохраненный вопрос не совпадет с присланным.
+    Всех ожидающих опрашивает одна задача - запросом в потоке раз в interval,
+    чтобы опрос не занимал цикл событий с фейковым Bot API и не искажал замеры.
+    """
+
+    CHUNK = 500  # user_id в одном IN (...)
+
+    def __init__(self, db_path: str, interval: float = 0.005):
+        self.db_path = db_path
+        self.interval = interval
+        self.waiting = {}  # user_id -> (текст головоломки, Future с ответом)
+        self._poller = None
+
+    async def read(self, user_id: int, puzzle_text: str, timeout: float) -> str:
+        """Ответ на головоломку из puzzle_text"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[user_id] = (puzzle_text, future)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if self.waiting.get(user_id, (None, None))[1] is future:
+                del self.waiting[user_id]
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        while self.waiting:
+            try:
+                rows = await loop.run_in_executor(None, self._fetch, list(self.waiting))
+            except sqlite3.Error as e:
+                for _, future in self.waiting.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for user_id, question, answer in rows:
+                puzzle_text, future = self.waiting.get(user_id, (None, None))
+                if future and not future.done() and question and question in puzzle_text:
+                    future.set_result(answer)
+                    del self.waiting[user_id]
+            await asyncio.sleep(self.interval)
+
+    def _fetch(self, user_ids: list) -> list:
+        """(user_id, вопрос, ответ) из user_states для user_ids - в потоке исполнителя"""
+        rows = []
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for start in range(0, len(user_ids), self.CHUNK):
+                chunk = user_ids[start:start + self.CHUNK]
+                rows += conn.execute(
+                    "SELECT user_id, current_puzzle_question, current_puzzle_answer FROM user_states "
+                    f"WHERE user_id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+        finally:
+            conn.close()
+        return rows
+
+
+async def wake_and_solve(user: SyntheticUser, answers: AnswerReader, results: dict):
+    """Дождаться будильника и решить обе головоломки, замеряя время ответа бота"""
+    received_at, _ = await user.expect(lambda text: "БУДИЛЬНИК" in text)
+    results["alarm_received"][user.user_id] = time.time() - (time.monotonic() - received_at)
+
+    for prefix in ("Доброе утро", "Тук-тук"):
+        _, puzzle_text = await user.expect(lambda text: text.startswith(prefix))
+        sent_at = user.say(await answers.read(user.user_id, puzzle_text, user.timeout))
+        replied_at, reply = await user.expect(lambda text: True)
+        results["answer_rtt"].append(replied_at - sent_at)
+        if not reply.startswith(("✅", "🎉")):
+            results["wrong_answers"] += 1
+            return
+    results["woken"] += 1
+
+
+def planned_alarms(db_path: str) -> dict:
+    """Запланированные моменты срабатывания (UTC epoch) по пользователям"""
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT user_id, next_fire_at FROM alarms").fetchall())
+
+
+def alarm_lateness(planned: dict, received: dict):
+    """Опоздание срабатывания: момент получения будильника минус запланированное время"""
+    return [received[user_id] - fire_at for user_id, fire_at in planned.items() if user_id in received and fire_at]
+
+
+def start_bot(api_port: int, db_path: str, log_file, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        BOT_TOKEN=BOT_TOKEN,
+        BOT_API_URL=f"http://127.0.0.1:{api_port}/bot",
+        DATABASE_PATH=db_path,
+        SNAPSHOT_PATH=os.path.join(os.path.dirname(db_path), "scheduler.snapshot"),
+        UPDATE_MODE="polling",
+        DEFAULT_TIMEZONE="UTC",
+        DELAY_BETWEEN_PUZZLES=str(args.puzzle_delay),
+        OUTBOUND_RATE=str(args.rate),
+        OUTBOUND_BURST=str(max(1, int(args.rate))),
+        ALARM_TICK_INTERVAL="1",
+    )
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    return subprocess.Popen([sys.executable, main_py], env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+async def run(args) -> dict:
+    api = FakeBotAPI()
+    server, port = await api.start()
+    workdir = tempfile.mkdtemp(prefix="alarm-loadtest-")
+    db_path = os.path.join(workdir, "alarm_bot.db")
+    log_path = os.path.join(workdir, "bot.log")
+
+    results = {"alarm_received": {}, "answer_rtt": [], "woken": 0, "wrong_answers": 0}
+    sent_before, timeouts, planned = 0, 0, {}
+
+    with open(log_path, "w") as log_file:
+        bot = start_bot(port, db_path, log_file, args)
+        try:
+            await asyncio.wait_for(api.polling.wait(), args.timeout)
+            users = [SyntheticUser(10_000 + i, api, args.timeout) for i in range(args.users)]
+
+            # 1. /start
+            for user in users:
+                user.say("/start")
+            await asyncio.gather(*(user.expect(lambda text: text.startswith("Привет")) for user in users))
+
+            # 2. Будильник: все пользователи просыпаются в одном окне (бот считает время в UTC)
+            window_start = (datetime.now(timezone.utc) + timedelta(seconds=args.lead + 60)).replace(second=0, microsecond=0)
+            window_end = window_start + timedelta(minutes=args.spread)
+            window = f"{window_start:%H:%M} - {window_end:%H:%M}"
+            for user in users:
+                user.say(window)
+            await asyncio.gather(*(user.expect(lambda text: text.startswith("✅ Будильник")) for user in users))
+            print(f"⏰ {args.users} будильников установлено на {window} UTC", flush=True)
+            planned = planned_alarms(db_path)
+
+            # 3. Срабатывание и головоломки
+            sent_before = len(api.sent_at)
+            answers = AnswerReader(db_path)
+            outcomes = await asyncio.gather(
+                *(wake_and_solve(user, answers, results) for user in users), return_exceptions=True
+            )
+            timeouts = sum(isinstance(outcome, asyncio.TimeoutError) for outcome in outcomes)
+        finally:
+            bot.terminate()
+            # Ждем в потоке: цикл событий должен отвечать боту на последние getUpdates, пока он останавливается
+            await asyncio.get_running_loop().run_in_executor(None, bot.wait, 30)
+            server.close()
+
+    fired_messages = api.sent_at[sent_before:]
+    duration = fired_messages[-1] - fired_messages[0] if len(fired_messages) > 1 else 0
+    lateness = alarm_lateness(planned, results["alarm_received"])
+    rtt = results["answer_rtt"]
+
+    return {
+        "users": args.users,
+        "alarms_received": len(results["alarm_received"]),
+        "woken": results["woken"],
+        "wrong_answers": results["wrong_answers"],
+        "timeouts": timeouts,
+        "alarm_lateness_p50_s": percentile(lateness, 0.50),
+        "alarm_lateness_p99_s": percentile(lateness, 0.99),
+        "answer_rtt_p50_ms": percentile(rtt, 0.50) and percentile(rtt, 0.50) * 1000,
+        "answer_rtt_p99_ms": percentile(rtt, 0.99) and percentile(rtt, 0.99) * 1000,
+        "messages_per_second": len(fired_messages) / duration if duration else None,
+        "bot_log": log_path,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота 'Доброе утро' на фейковом Bot API")
+    parser.add_argument("--users", type=int, default=1000, help="сколько синтетических пользователей")
+    parser.add_argument("--spread", type=int, default=0, help="ширина окна будильника в минутах")
+    parser.add_argument("--lead", type=int, default=30, help="минимум секунд между установкой и окном будильника")
+    parser.add_argument("--puzzle-delay", type=int, default=5, help="пауза перед второй головоломкой, секунд")
+    parser.add_argument("--rate", type=float, default=30, help="лимит исходящих сообщений в секунду")
+    parser.add_argument("--timeout", type=float, default=900, help="сколько ждать каждого ответа бота, секунд")
+    parser.add_argument("--output", help="куда сохранить результат в JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
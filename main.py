@@ -1,78 +1,266 @@
 import asyncio
-from datetime import time
+import time
+from datetime import datetime
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
-from config import BOT_TOKEN, logger
+from config import (
+    BOT_TOKEN, BOT_API_URL, ALARM_TICK_INTERVAL, DEADLINE_SWEEP_INTERVAL, MAX_ALARM_LATENESS, logger,
+    UPDATE_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET,
+    SHARD_COUNT, SHARD_INDEX, METRICS_LISTEN, METRICS_PORT, SNAPSHOT_PATH
+)
+import handlers
 from handlers import (
-    start, handle_message,
-    send_puzzle_to_user, generate_random_wake_time,
-    db
+    start, handle_message, profile_command, timezone_command,
+    send_puzzle_to_user, generate_wake_times,
+    handle_deadline, load_sessions, use_storage,
+    scheduler, deadlines, dispatcher
+)
+from metrics import (
+    ALARM_LATENESS, OUTBOUND_QUEUE, PENDING_DEADLINES, PENDING_WRITES, SOLVE_QUANTILES, start_metrics_server
 )
-from database import Database
+from profiling import profiled, profiler, enable_from_config
+from puzzles import puzzle_pool
+from scheduler import first_fire_at, plan_fire_at, user_zone
+from sharding import run_sharded
+from snapshot import read_snapshot, save_snapshot
+from storage import create_storage
+
+async def load_alarms():
+    """Загружает будильники из базы в планировщик"""
+    alarms = await handlers.db.get_active_alarms(SHARD_COUNT, SHARD_INDEX)
+    await restore_alarms([
+        (user_id, next_fire_at, (start_minute, end_minute, user_zone(timezone)))
+        for user_id, start_minute, end_minute, _, next_fire_at, timezone in alarms
+    ])
+
+async def restore_alarms(timers):
+    """Ставит будильники (user_id, fire_at, window) в планировщик одним пакетом"""
+    now = int(time.time())
+    oldest = now - MAX_ALARM_LATENESS
+    scheduler.load([timer for timer in timers if timer[1] is not None and timer[1] >= oldest])
+
+    # Будильники без срабатывания или пропущенные, пока бот не работал, планируются заново одним пакетом
+    stale = [(user_id, window) for user_id, fire_at, window in timers if fire_at is None or fire_at < oldest]
+    if stale:
+        planned = plan_next_alarms(stale, now, first=True)
+        await handlers.db.update_alarm_wake_times(planned)
+        logger.info(f"Сгенерировано время пробуждения для {len(planned)} будильников")
+
+    logger.info(f"В планировщике {len(scheduler)} будильников")
+
+def snapshot_path() -> str:
+    """Файл снимка планировщика этого процесса ("" - снимки выключены)"""
+    if SNAPSHOT_PATH and SHARD_COUNT > 1:
+        return f"{SNAPSHOT_PATH}.shard{SHARD_INDEX}"
+    return SNAPSHOT_PATH
+
+async def warm_start():
+    """Поднимает будильники, сценарии пробуждения и примеры головоломок из снимка, сверив его с базой.
+
+    Часть снимка, разошедшаяся с базой (например, после admin.py import), и все
+    состояние, если снимка нет, загружаются из базы как при холодном старте.
+    """
+    started = time.perf_counter()
+    snapshot = read_snapshot(snapshot_path(), SHARD_COUNT, SHARD_INDEX) if snapshot_path() else None
+    if snapshot is None:
+        await load_alarms()
+        await load_sessions()
+        return
+
+    alarms, sessions = await handlers.db.get_fingerprints(SHARD_COUNT, SHARD_INDEX)
+    if snapshot.alarm_fingerprint == alarms:
+        await restore_alarms(snapshot.alarms())
+    else:
+        logger.warning("⚠️ Будильники в снимке разошлись с базой, загружаю их из базы")
+        await load_alarms()
+
+    if snapshot.session_fingerprint == sessions:
+        handlers.wake_flow.restore(snapshot.sessions())
+        await handlers.solve_times.load()
+    else:
+        logger.warning("⚠️ Незавершенные пробуждения в снимке разошлись с базой, загружаю их из базы")
+        await load_sessions()
+
+    handlers.user_example_puzzles.update(snapshot.examples())
+    logger.info(f"⚡ Теплый старт из снимка ({time.time() - snapshot.written_at:.0f} с назад) "
+                f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+def save_scheduler_snapshot():
+    """Сохраняет снимок планировщика при остановке; ошибка записи не мешает остановке"""
+    path = snapshot_path()
+    if not path:
+        return
+    try:
+        save_snapshot(path, scheduler, handlers.wake_flow, handlers.user_example_puzzles, SHARD_COUNT, SHARD_INDEX)
+    except OSError as e:
+        logger.error(f"❌ Не удалось сохранить снимок планировщика в {path}: {e}")
+
+def plan_next_alarms(alarms, now: int, first: bool = False) -> list:
+    """Выбирает новое время пробуждения для пачки (user_id, window) и ставит их в планировщик.
+
+    first=True - будильник может сработать еще в текущем окне, иначе - в следующем.
+    Возвращает строки (user_id, wake_minute, next_fire_at) для записи в базу.
+    """
+    wake_minutes = generate_wake_times((start_minute, end_minute) for _, (start_minute, end_minute, _) in alarms)
+    planned = []
+    for (user_id, window), wake_minute in zip(alarms, wake_minutes):
+        start_minute, end_minute, zone = window
+        if first:
+            fire_at = first_fire_at(start_minute, end_minute, wake_minute, zone, now)
+        else:
+            fire_at = plan_fire_at(start_minute, wake_minute, zone, now)
+        scheduler.schedule_alarm(user_id, fire_at, window)
+        planned.append((user_id, wake_minute, fire_at))
+    return planned
+
+async def wake_user(user_id: int, fire_at: int, context: ContextTypes.DEFAULT_TYPE):
+    """Будит одного пользователя: ставит сообщения в очередь и выдает головоломку"""
+    # ЗВОНИМ БУДИЛЬНИК! Опоздание считаем по фактической отправке первого сообщения
+    dispatcher.send(
+        user_id, "🔔 🔔 🔔 БУДИЛЬНИК! 🔔 🔔 🔔",
+        on_sent=lambda: ALARM_LATENESS.observe(time.time() - fire_at)
+    )
+    dispatcher.send(user_id, "⏰ ПРОСЫПАЙСЯ! ⏰")
+    dispatcher.send(user_id, "🌅 ДОБРОЕ УТРО! 🌅")
+
+    # Отправляем головоломку
+    await send_puzzle_to_user(user_id, context)
+
+    lateness = time.time() - fire_at
+    logger.info(f"Будильник сработал для {user_id} в {datetime.fromtimestamp(fire_at):%H:%M} (опоздание {lateness:.0f} с)")
 
+@profiled
 async def check_alarms(context: ContextTypes.DEFAULT_TYPE):
-    """Проверяет и активирует будильники каждую минуту"""
-    alarms = db.get_active_alarms()
-
-    current_time = datetime.now()
-    current_date = current_time.date().isoformat()
-    current_time_str = current_time.strftime("%H:%M")
-
-    for user_id, time_start_str, time_end_str, random_wake_time, last_activation_date in alarms:
-        # Если нет случайного времени ИЛИ сегодня еще не активировался
-        if not random_wake_time or last_activation_date != current_date:
-            # Генерируем случайное время
-            wake_time = generate_random_wake_time(time_start_str, time_end_str)
-
-            # Сохраняем в базу
-            db.update_alarm_wake_time(user_id, wake_time, current_date)
-            logger.info(f"Сгенерировано время пробуждения для {user_id}: {wake_time}")
-            continue
-
-        # Проверяем, пора ли будить
-        if random_wake_time == current_time_str:
-            # ЗВОНИМ БУДИЛЬНИК!
-            await context.bot.send_message(user_id, "🔔 🔔 🔔 БУДИЛЬНИК! 🔔 🔔 🔔")
-            await asyncio.sleep(1)
-            await context.bot.send_message(user_id, "⏰ ПРОСЫПАЙСЯ! ⏰")
-            await asyncio.sleep(1)
-            await context.bot.send_message(user_id, "🌅 ДОБРОЕ УТРО! 🌅")
-
-            # Отправляем головоломку
-            await send_puzzle_to_user(user_id, context)
-
-            # Деактивируем будильник до завтра
-            db.deactivate_alarm(user_id)
-            logger.info(f"Будильник сработал для {user_id} в {current_time_str}")
-
-async def reset_daily_alarms(context: ContextTypes.DEFAULT_TYPE):
-    """Ежедневно в 00:01 активирует все будильники"""
-    db.reset_all_alarms()
-    logger.info("Все будильники сброшены на активное состояние")
+    """Будит пользователей, чье время пробуждения наступило, и планирует их будильники на следующий день"""
+    # Планировщик отдает только наступившие будильники, включая пропущенные тики
+    now = int(time.time())
+    due, missed = scheduler.pop_due_alarms(now)
+    if not due and not missed:
+        return
+
+    results = await asyncio.gather(
+        *(wake_user(user_id, fire_at, context) for user_id, fire_at, _ in due),
+        return_exceptions=True
+    )
+    for (user_id, _, _), result in zip(due, results):
+        if isinstance(result, Exception):
+            logger.error(f"Не удалось разбудить {user_id}: {result}")
+
+    # Следующее срабатывание - в следующем окне; в базу пишем одним пакетом
+    planned = plan_next_alarms([(user_id, window) for user_id, _, window in due + missed], now)
+    await handlers.db.update_alarm_wake_times(planned)
+
+    logger.info(f"Разбужено пользователей: {len(due)}, сообщений в очереди: {dispatcher.queue_depth}")
+
+    # Пополняем буфер головоломок уже после рассылки
+    puzzle_pool.refill()
+
+async def sweep_deadlines(context: ContextTypes.DEFAULT_TYPE):
+    """Обрабатывает наступившие дедлайны головоломок по порядку"""
+    for user_id, _, _ in deadlines.pop_due(time.time()):
+        try:
+            await handle_deadline(user_id, context)
+        except Exception as e:
+            logger.error(f"Не удалось обработать дедлайн для {user_id}: {e}")
+
+async def post_init(application: Application):
+    """Загружает будильники и дедлайны головоломок (из снимка или базы) и поднимает метрики перед стартом бота"""
+    dispatcher.start(application.bot)
+    puzzle_pool.refill()
+    await warm_start()
+    enable_from_config()
+
+    OUTBOUND_QUEUE.set_function(lambda: dispatcher.queue_depth)
+    PENDING_DEADLINES.set_function(lambda: len(deadlines))
+    PENDING_WRITES.set_function(lambda: handlers.db.pending_writes)
+    SOLVE_QUANTILES.set_function(lambda: handlers.solve_times.category_quantiles())
+    if METRICS_PORT:
+        application.bot_data["metrics_server"] = await start_metrics_server(METRICS_LISTEN, METRICS_PORT + SHARD_INDEX)
+
+async def post_shutdown(application: Application):
+    """Завершает работу после остановки бота.
+
+    К этому моменту PTB уже перестал принимать обновления и остановил фоновые
+    задачи, так что планировщик больше не меняется. Порядок: дослать очередь
+    сообщений, дописать отложенные записи, сохранить снимок планировщика,
+    закрыть базу данных и эндпоинт метрик.
+    """
+    await dispatcher.drain(timeout=30)
+    if dispatcher.queue_depth:
+        logger.warning(f"⚠️ Не досланы сообщения при остановке: {dispatcher.queue_depth}")
+    await handlers.db.flush()
+    save_scheduler_snapshot()
+    handlers.db.close()
+    profiler.disable()
+
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server:
+        metrics_server.close()
+
+def run_updates(application: Application):
+    """Получает обновления через webhook или long polling в зависимости от UPDATE_MODE"""
+    if UPDATE_MODE == "webhook":
+        if not WEBHOOK_SECRET:
+            raise RuntimeError("Для режима webhook нужно задать WEBHOOK_SECRET")
+
+        logger.info(f"🌐 Принимаю обновления на http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET
+        )
+    else:  # "polling"; другие значения UPDATE_MODE отвергает config
+        application.run_polling()
+
+def build_application(with_updater: bool = True, storage=None) -> Application:
+    """Создает Application с обработчиками и фоновыми задачами.
+
+    storage - хранилище (storage.Storage); по умолчанию создается выбранное в STORAGE_BACKEND.
+    """
+    use_storage(storage or create_storage())
 
-def main():
-    """Основная функция запуска бота"""
     # Создаем Application с job_queue
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        # Шард получает обновления от фронтового процесса, а не из Telegram
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Обработчики
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("profile", profile_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     # Фоновые задачи
     job_queue = application.job_queue
 
     if job_queue:
-        job_queue.run_repeating(check_alarms, interval=60, first=10)  # Каждую минуту
-        job_queue.run_daily(reset_daily_alarms, time=time(0, 1), days=tuple(range(7)))  # Каждый день в 00:01
+        job_queue.run_repeating(check_alarms, interval=ALARM_TICK_INTERVAL, first=1)  # Проверка наступивших будильников
+        job_queue.run_repeating(sweep_deadlines, interval=DEADLINE_SWEEP_INTERVAL, first=1)  # Таймауты головоломок
         logger.info("✅ Фоновые задачи запущены!")
     else:
         logger.warning("⚠️ Job queue не доступен, будильники не будут работать")
 
+    return application
+
+def main():
+    """Основная функция запуска бота"""
     print("🤖 Бот 'Доброе утро' запущен!")
     print("📱 Иди в Telegram и напиши /start")
 
-    application.run_polling()
+    if SHARD_COUNT > 1:
+        run_sharded(run_updates)
+    else:
+        run_updates(build_application())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
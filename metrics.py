@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config import logger
+
+# Границы корзин гистограмм, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LATENESS_BUCKETS = (0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900)
+
+
+def format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Метрика с необязательными метками; значения хранятся по кортежу значений меток"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+        self._function = None
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set_function(self, function):
+        """Брать значения {значения меток: счетчик} из function() при каждом сборе"""
+        self._function = function
+
+    def value(self, *label_values) -> float:
+        return self._collect().get(label_values, 0)
+
+    def _collect(self) -> dict:
+        return self._function() if self._function else self._values
+
+    def render(self):
+        lines = self.header()
+        for label_values, value in sorted(self._collect().items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(Metric):
+    """Текущее значение; может вычисляться функцией в момент сбора.
+
+    У метрики с метками значения берутся только из функции: {значения меток: значение}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        super().__init__(name, documentation, labels)
+        self._value = 0
+        self._function = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function):
+        """Брать значение (или {значения меток: значение}) из function() при каждом сборе"""
+        self._function = function
+
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def render(self):
+        if not self.labels:
+            return self.header() + [f"{self.name} {self.value()}"]
+        lines = self.header()
+        for label_values, value in sorted((self._function() if self._function else {}).items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам, плюс сумма и количество"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счетчики корзин..., +Inf, сумма]
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """Замерить длительность блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = self.header()
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Все метрики процесса; render() отдает их в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+ALARM_LATENESS = REGISTRY.register(Histogram(
+    "alarm_fire_lateness_seconds", "Запланированное время пробуждения -> фактическая отправка будильника",
+    buckets=LATENESS_BUCKETS
+))
+DB_LATENCY = REGISTRY.register(Histogram(
+    "db_query_seconds", "Длительность методов Database", labels=("method",)
+))
+SEND_LATENCY = REGISTRY.register(Histogram(
+    "telegram_send_seconds", "Длительность вызова send_message"
+))
+SEND_FAILURES = REGISTRY.register(Counter(
+    "telegram_send_failures_total", "Неудачные отправки сообщений", labels=("reason",)
+))
+OUTBOUND_QUEUE = REGISTRY.register(Gauge(
+    "outbound_queue_depth", "Сообщений в очереди на отправку"
+))
+PENDING_DEADLINES = REGISTRY.register(Gauge(
+    "puzzle_deadlines_pending", "Ожидающих дедлайнов головоломок (таймауты и отложенная вторая головоломка)"
+))
+PENDING_WRITES = REGISTRY.register(Gauge(
+    "db_pending_writes", "Отложенных записей состояний и статистики, еще не сброшенных в базу"
+))
+SOLVE_TIME = REGISTRY.register(Histogram(
+    "puzzle_solve_seconds", "От доставки головоломки до верного ответа",
+    buckets=LATENESS_BUCKETS, labels=("puzzle", "category")
+))
+SOLVE_QUANTILES = REGISTRY.register(Gauge(
+    "puzzle_solve_quantile_seconds", "Медиана и 90-й перцентиль времени решения по категории головоломок (все шарды)",
+    labels=("category", "quantile")
+))
+PUZZLE_OUTCOMES = REGISTRY.register(Counter(
+    "puzzle_outcomes_total", "Итоги пробуждений", labels=("status",)
+))
+CACHE_HITS = REGISTRY.register(Counter(
+    "cache_hits_total", "Попадания в LRU-кеши", labels=("cache",)
+))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "cache_misses_total", "Промахи LRU-кешей", labels=("cache",)
+))
+
+# Кеши, чьи счетчики попаданий и промахов отдаются в метриках: имя -> cache.LRUCache
+_caches = {}
+CACHE_HITS.set_function(lambda: {(name,): cache.hits for name, cache in _caches.items()})
+CACHE_MISSES.set_function(lambda: {(name,): cache.misses for name, cache in _caches.items()})
+
+
+def watch_cache(name: str, cache):
+    """Отдавать попадания и промахи LRU-кеша в cache_hits_total и cache_misses_total с меткой cache=name"""
+    _caches[name] = cache
+    return cache
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Отдает текущие метрики на GET /metrics и закрывает соединение"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        if request_line.split(b" ")[1:2] == [b"/metrics"]:
+            body = REGISTRY.render().encode()
+            status = b"200 OK"
+        else:
+            body, status = b"Not Found\n", b"404 Not Found"
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int):
+    """Поднимает HTTP-эндпоинт /metrics"""
+    server = await asyncio.start_server(serve_metrics, host, port)
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return server
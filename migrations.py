@@ -0,0 +1,176 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Миграции схемы применяются строго по порядку и только вперед.
+# Номер последней примененной миграции хранится в PRAGMA user_version.
+# Уже выпущенные миграции не редактируем - добавляем новые в конец списка.
+MIGRATIONS = [
+    # 1: исходные таблицы
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        first_name TEXT,
+        username TEXT,
+        created_at TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS alarms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        time_start TEXT,
+        time_end TEXT,
+        random_wake_time TEXT,
+        last_activation_date TEXT,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS user_states (
+        user_id INTEGER PRIMARY KEY,
+        state TEXT DEFAULT 'SLEEP',
+        current_puzzle_question TEXT,
+        current_puzzle_answer TEXT,
+        puzzle_sent_at TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS statistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        date TEXT,
+        status TEXT,
+        solve_time_1 INTEGER,
+        solve_time_2 INTEGER
+    );
+    ''',
+
+    # 2: индексы под запросы по пользователю и выборку активных будильников
+    '''
+    DELETE FROM alarms WHERE id NOT IN (SELECT MAX(id) FROM alarms GROUP BY user_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_alarms_user_id ON alarms (user_id);
+    CREATE INDEX IF NOT EXISTS idx_alarms_active_wake_time ON alarms (is_active, random_wake_time);
+    CREATE INDEX IF NOT EXISTS idx_statistics_user_date ON statistics (user_id, date);
+    ''',
+
+    # 3: дедлайны головоломок (таймауты и отложенная вторая головоломка) переживают перезапуск
+    '''
+    ALTER TABLE user_states ADD COLUMN deadline_kind TEXT;
+    ALTER TABLE user_states ADD COLUMN deadline_at TEXT;
+    CREATE INDEX IF NOT EXISTS idx_user_states_deadline ON user_states (deadline_at) WHERE deadline_at IS NOT NULL;
+    ''',
+
+    # 4: накопительная статистика по дням и по пользователю (серии считаются с момента миграции)
+    '''
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        user_id INTEGER,
+        day TEXT,
+        success INTEGER DEFAULT 0,
+        failed_first INTEGER DEFAULT 0,
+        failed_second INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        success INTEGER DEFAULT 0,
+        failed_first INTEGER DEFAULT 0,
+        failed_second INTEGER DEFAULT 0,
+        current_streak INTEGER DEFAULT 0,
+        best_streak INTEGER DEFAULT 0,
+        last_success_day TEXT
+    );
+
+    INSERT OR REPLACE INTO daily_stats (user_id, day, success, failed_first, failed_second)
+    SELECT user_id, substr(date, 1, 10),
+           SUM(status = 'success'), SUM(status = 'failed_first'), SUM(status = 'failed_second')
+    FROM statistics GROUP BY user_id, substr(date, 1, 10);
+
+    INSERT OR REPLACE INTO user_stats (user_id, success, failed_first, failed_second)
+    SELECT user_id, SUM(success), SUM(failed_first), SUM(failed_second)
+    FROM daily_stats GROUP BY user_id;
+    ''',
+
+    # 5: окно будильника в минутах от начала суток, часовой пояс пользователя и
+    # ближайшее срабатывание в UTC (секунды epoch). Время пробуждения выбирается
+    # заново при первой загрузке, потому что старое хранилось без часового пояса.
+    '''
+    CREATE TABLE alarms_v5 (
+        user_id INTEGER PRIMARY KEY,
+        start_minute INTEGER NOT NULL,
+        end_minute INTEGER NOT NULL,
+        wake_minute INTEGER,
+        next_fire_at INTEGER,
+        created_at TEXT
+    );
+
+    INSERT INTO alarms_v5 (user_id, start_minute, end_minute, created_at)
+    SELECT user_id,
+           CAST(substr(time_start, 1, instr(time_start, ':') - 1) AS INTEGER) * 60
+               + CAST(substr(time_start, instr(time_start, ':') + 1) AS INTEGER),
+           CAST(substr(time_end, 1, instr(time_end, ':') - 1) AS INTEGER) * 60
+               + CAST(substr(time_end, instr(time_end, ':') + 1) AS INTEGER),
+           created_at
+    FROM alarms WHERE user_id IS NOT NULL AND instr(time_start, ':') > 0 AND instr(time_end, ':') > 0;
+
+    DROP TABLE alarms;
+    ALTER TABLE alarms_v5 RENAME TO alarms;
+    CREATE INDEX idx_alarms_next_fire_at ON alarms (next_fire_at);
+
+    ALTER TABLE users ADD COLUMN timezone TEXT;
+    ''',
+
+    # 6: скетчи квантилей времени решения (sketch.QuantileSketch) по пользователю и по категории
+    # головоломки; statistics.solve_time_1/2 с этой версии заполняются, в миллисекундах
+    '''
+    CREATE TABLE IF NOT EXISTS solve_sketches (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID;
+    ''',
+
+    # 7: дедлайн сценария в UTC (секунды epoch) вместо местного времени сервера, которое
+    # неоднозначно при переводе часов; старые значения пересчитываются из местного времени
+    '''
+    CREATE TABLE user_states_v7 (
+        user_id INTEGER PRIMARY KEY,
+        state TEXT DEFAULT 'SLEEP',
+        current_puzzle_question TEXT,
+        current_puzzle_answer TEXT,
+        puzzle_sent_at TEXT,
+        deadline_kind TEXT,
+        deadline_at INTEGER
+    );
+
+    INSERT INTO user_states_v7
+    SELECT user_id, state, current_puzzle_question, current_puzzle_answer, puzzle_sent_at, deadline_kind,
+           CAST(strftime('%s', deadline_at, 'utc') AS INTEGER)
+    FROM user_states;
+
+    DROP TABLE user_states;
+    ALTER TABLE user_states_v7 RENAME TO user_states;
+    CREATE INDEX idx_user_states_deadline ON user_states (deadline_at) WHERE deadline_at IS NOT NULL;
+    ''',
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn) -> int:
+    """Применить недостающие миграции и вернуть версию схемы"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Схема базы (версия {version}) новее, чем знает бот ({SCHEMA_VERSION})")
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        try:
+            conn.executescript(f"BEGIN; {MIGRATIONS[number - 1]}; PRAGMA user_version = {number}; COMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            logger.exception(f"Миграция {number} не применена")
+            raise
+        logger.info(f"✅ Применена миграция схемы {number}")
+
+    return SCHEMA_VERSION
@@ -0,0 +1,162 @@
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from config import (
+    logger, PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_STALL_MS, SHARD_INDEX
+)
+
+
+class Profiler:
+    """Выборочный профилировщик обработчиков и детектор зависаний цикла событий.
+
+    Профилируется доля sample_rate вызовов. cProfile в процессе может быть
+    включен только один, поэтому одновременно профилируется один вызов; пока он
+    ждет await, в профиль попадает и код других задач - это видно по функциям
+    из чужих модулей. Время всех выбранных вызовов учитывается отдельно.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 stall_ms: float = PROFILE_STALL_MS):
+        self.enabled = False
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.stall_threshold = stall_ms / 1000
+        self._profiles = {}  # имя -> cProfile.Profile
+        self._timings = {}   # имя -> [вызовов, суммарно секунд, максимум секунд]
+        self._stalls = []    # (когда, сколько секунд, стек)
+        self._active = False
+        self._last_beat = 0.0
+        self._heartbeat = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    def enable(self):
+        """Включить профилирование; вызывается из работающего цикла событий"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(),), name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(f"🔬 Профилирование включено: {self.sample_rate:.0%} вызовов, зависания от {self.stall_threshold * 1000:.0f} мс")
+
+    def disable(self):
+        """Выключить профилирование и сбросить накопленное в файлы"""
+        if not self.enabled:
+            return None
+        self.enabled = False
+        self._stop.set()
+        self._heartbeat.cancel()
+        self._watchdog.join()
+        logger.info("🔬 Профилирование выключено")
+        return self.dump()
+
+    async def run(self, name: str, function, *args, **kwargs):
+        """Выполнить function, профилируя вызов с вероятностью sample_rate"""
+        if random.random() >= self.sample_rate:
+            return await function(*args, **kwargs)
+
+        profile = None
+        if not self._active:
+            self._active = True
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile:
+                profile.disable()
+                self._active = False
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    def dump(self) -> str:
+        """Записать профили (.prof для pstats/snakeviz) и текстовую сводку; вернуть путь к сводке"""
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S}-shard{SHARD_INDEX}")
+        report = io.StringIO()
+
+        report.write("Выбранные вызовы (вызовов, среднее мс, максимум мс):\n")
+        for name, (calls, total, longest) in sorted(self._timings.items()):
+            report.write(f"  {name}: {calls}, {total / calls * 1000:.1f}, {longest * 1000:.1f}\n")
+
+        for name, profile in sorted(self._profiles.items()):
+            profile.dump_stats(f"{prefix}-{name}.prof")
+            report.write(f"\n=== {name} ===\n")
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(30)
+
+        # Сторожевой поток может дописывать зависания прямо сейчас
+        stalls, self._stalls = self._stalls, []
+        report.write(f"\nЗависания цикла событий дольше {self.stall_threshold * 1000:.0f} мс: {len(stalls)}\n")
+        for moment, blocked, stack in stalls:
+            report.write(f"\n--- {moment:%H:%M:%S.%f} цикл стоит уже {blocked * 1000:.0f} мс ---\n{stack}")
+
+        path = f"{prefix}-summary.txt"
+        with open(path, "w") as f:
+            f.write(report.getvalue())
+
+        self._profiles.clear()
+        self._timings.clear()
+        logger.info(f"🔬 Профили сохранены: {path}")
+        return path
+
+    async def _beat(self):
+        # Отметка времени, которую цикл событий обновляет, пока он не занят
+        interval = self.stall_threshold / 4
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _watch(self, loop_thread_id: int):
+        # Сторожевой поток: если отметка давно не обновлялась, запоминает стек потока цикла событий
+        interval = self.stall_threshold / 4
+        reported_beat = None
+        while not self._stop.wait(interval):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat - interval
+            if blocked > self.stall_threshold and beat != reported_beat:
+                reported_beat = beat
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                self._stalls.append((datetime.now(), blocked, stack))
+                logger.warning(f"🐢 Цикл событий заблокирован больше {blocked * 1000:.0f} мс")
+
+
+profiler = Profiler()
+
+
+def profiled(function):
+    """Обернуть корутину-обработчик: при выключенном профилировщике это один лишний if"""
+    name = function.__name__
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return await function(*args, **kwargs)
+        return await profiler.run(name, function, *args, **kwargs)
+
+    return wrapper
+
+
+def enable_from_config():
+    """Включить профилирование при старте, если задано PROFILE=1"""
+    if PROFILE_ENABLED:
+        profiler.enable()
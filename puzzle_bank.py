@@ -0,0 +1,192 @@
+"""Упакованный банк головоломок.
+
+Сборка (python puzzle_bank.py) убирает повторы из puzzle_source и пишет
+компактный файл:
+
+    заголовок     magic, версия, число категорий, число головоломок
+    категории     имя, номер первой головоломки, сколько их (категории идут подряд)
+    индекс        смещение каждой записи в блоке данных и конец блока
+    данные        "вопрос\\0ответ" в UTF-8
+
+Бот открывает файл через mmap и читает запись только при обращении к ней,
+поэтому при старте не разбираются литералы Python, а страницы файла общие
+для всех процессов-шардов.
+"""
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import tempfile
+from contextlib import suppress
+
+from config import logger, PUZZLE_BANK_PATH
+from puzzle_generator import make_puzzle
+
+MAGIC = b"PZLB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")     # magic, версия, категорий, головоломок
+CATEGORY = struct.Struct("<16sII")   # имя, первая головоломка, сколько
+OFFSET = struct.Struct("<I")
+RECORD_BOUNDS = struct.Struct("<II")  # начало записи и начало следующей
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzle_source.py")
+
+
+class BankCategory:
+    """Головоломки одной категории как последовательность (подходит для random.choice)"""
+
+    def __init__(self, bank, first: int, count: int):
+        self._bank = bank
+        self._first = first
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> dict:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._bank[self._first + index]
+
+
+class PuzzleBank:
+    """Банк головоломок, отображенный в память"""
+
+    def __init__(self, path: str = PUZZLE_BANK_PATH):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, category_count, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} - не банк головоломок версии {VERSION}")
+
+        self._names, self._starts, self.categories = [], [], {}
+        for i in range(category_count):
+            name, first, count = CATEGORY.unpack_from(self._map, HEADER.size + i * CATEGORY.size)
+            name = name.rstrip(b"\0").decode()
+            self._names.append(name)
+            self._starts.append(first)
+            self.categories[name] = BankCategory(self, first, count)
+
+        self._index_at = HEADER.size + category_count * CATEGORY.size
+        self._data_at = self._index_at + (self._count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> dict:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = RECORD_BOUNDS.unpack_from(self._map, self._index_at + index * OFFSET.size)
+        question, answer = self._map[self._data_at + start:self._data_at + end].decode().split("\0")
+        category = self._names[bisect.bisect_right(self._starts, index) - 1]
+        return make_puzzle(category, question, answer)
+
+    def category(self, name: str) -> BankCategory:
+        """Головоломки одной категории"""
+        return self.categories[name]
+
+    def sample(self, rng: random.Random = random) -> dict:
+        """Случайная головоломка любой категории; все головоломки равновероятны"""
+        return self[rng.randrange(self._count)]
+
+    def close(self):
+        self._map.close()
+
+
+def build_bank(categories: dict, path: str = PUZZLE_BANK_PATH) -> int:
+    """Упаковать {категория: [{"question", "answer"}]} в файл без повторов; вернуть число головоломок.
+
+    Повтором считается тот же вопрос (в любой категории); остается первое вхождение.
+    Файл заменяется атомарно, так что уже открытые банки продолжают читать старый.
+    """
+    seen = {}
+    packed = []  # (категория, [записи])
+    for name, puzzles in categories.items():
+        records = []
+        for puzzle in puzzles:
+            question, answer = puzzle["question"].strip(), str(puzzle["answer"]).strip()
+            if question in seen:
+                if seen[question] != answer:
+                    logger.warning(f"⚠️ Вопрос '{question}' уже есть с ответом '{seen[question]}', ответ '{answer}' отброшен")
+                continue
+            seen[question] = answer
+            records.append(f"{question}\0{answer}".encode())
+        packed.append((name, records))
+
+    total = sum(len(records) for _, records in packed)
+    chunks = [HEADER.pack(MAGIC, VERSION, len(packed), total)]
+    first = 0
+    for name, records in packed:
+        chunks.append(CATEGORY.pack(name.encode(), first, len(records)))
+        first += len(records)
+
+    offset = 0
+    data = []
+    for _, records in packed:
+        for record in records:
+            chunks.append(OFFSET.pack(offset))
+            offset += len(record)
+            data.append(record)
+    chunks.append(OFFSET.pack(offset))
+    chunks.extend(data)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(b"".join(chunks))
+        os.replace(temporary, path)
+    except OSError:
+        with suppress(OSError):
+            os.remove(temporary)
+        raise
+
+    duplicates = sum(len(puzzles) for puzzles in categories.values()) - total
+    logger.info(f"🧩 Банк головоломок собран: {total} головоломок, повторов убрано: {duplicates}, файл {path}")
+    return total
+
+
+def build_from_source(path: str = PUZZLE_BANK_PATH) -> int:
+    """Собрать банк из puzzle_source"""
+    from puzzle_source import CATEGORIES
+    return build_bank(CATEGORIES, path)
+
+
+def build_temporary_bank() -> PuzzleBank:
+    """Собрать банк во временный файл и открыть его; файл удаляется сразу, отображение живет до close()"""
+    descriptor, path = tempfile.mkstemp(prefix="puzzles-", suffix=".bin")
+    os.close(descriptor)
+    try:
+        build_from_source(path)
+        return PuzzleBank(path)
+    finally:
+        with suppress(OSError):
+            os.remove(path)
+
+
+def load_bank(path: str = PUZZLE_BANK_PATH) -> PuzzleBank:
+    """Открыть банк, предварительно собрав его, если файла нет или исходник новее.
+
+    Если записать банк в path нельзя (например, каталог только для чтения), он
+    собирается во временный файл - бот запускается, но собирает банк при каждом старте.
+    """
+    try:
+        stale = os.path.getmtime(path) < os.path.getmtime(SOURCE_PATH)
+    except FileNotFoundError:
+        stale = True
+    if stale:
+        try:
+            build_from_source(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось записать банк головоломок в {path} ({e}), собираю во временный файл")
+            return build_temporary_bank()
+    return PuzzleBank(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Собрать упакованный банк головоломок из puzzle_source.py")
+    parser.add_argument("--output", default=PUZZLE_BANK_PATH, help="куда записать банк")
+    build_from_source(parser.parse_args().output)
@@ -0,0 +1,135 @@
+import random
+from collections import deque
+
+from config import PUZZLE_DIFFICULTY, PUZZLE_POOL_SIZE
+
+RUSSIAN_ALPHABET = "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
+
+# Буквы, на которых шаг последовательности легко перепутать
+CONFUSING_LETTERS = set("ЁЪЫЬ")
+
+# Диапазон чисел в примерах для каждого уровня сложности
+NUMBER_RANGES = {
+    1: (2, 20),
+    2: (10, 60),
+    3: (20, 150),
+}
+
+# Максимальный шаг в последовательностях букв
+LETTER_STEPS = {1: 1, 2: 2, 3: 3}
+
+
+def make_puzzle(category: str, question: str, answer) -> dict:
+    return {"question": question, "answer": str(answer), "category": category}
+
+
+class PuzzleGenerator:
+    """Генерирует головоломки на лету; ответ вычисляется вместе с вопросом"""
+
+    def __init__(self, difficulty: int = PUZZLE_DIFFICULTY, word_bank=None, rng: random.Random = None):
+        self.difficulty = difficulty
+        self.word_bank = word_bank or []
+        self.rng = rng or random.Random()
+
+        self.categories = [self.arithmetic, self.number_sequence, self.letter_sequence]
+        if self.word_bank:
+            self.categories.append(self.word_sequence)
+
+    def generate(self) -> dict:
+        """Головоломка случайной категории"""
+        return self.rng.choice(self.categories)()
+
+    def arithmetic(self) -> dict:
+        """Пример из трех чисел, например '15 * 3 + 10 = ?'"""
+        rng = self.rng
+        low, high = NUMBER_RANGES[self.difficulty]
+        form = rng.randrange(4)
+
+        if form == 0:
+            a, b, c = rng.randint(low, high), rng.randint(2, 9), rng.randint(low, high)
+            return make_puzzle("math", f"{a} * {b} + {c} = ?", a * b + c)
+        if form == 1:
+            a, b = rng.randint(low, high), rng.randint(2, 9)
+            c = rng.randint(1, a * b - 1)
+            return make_puzzle("math", f"({a} * {b}) - {c} = ?", a * b - c)
+        if form == 2:
+            # Делимое подбираем так, чтобы деление было нацело
+            b, quotient, c = rng.randint(2, 12), rng.randint(2, high // 2 + 2), rng.randint(low, high)
+            return make_puzzle("math", f"{b * quotient} / {b} + {c} = ?", quotient + c)
+
+        a, b = rng.randint(low, high), rng.randint(low, high)
+        c = rng.randint(1, a + b - 1)
+        return make_puzzle("math", f"{a} + {b} - {c} = ?", a + b - c)
+
+    def number_sequence(self) -> dict:
+        """Арифметическая, геометрическая или 'удвоить и прибавить' последовательность"""
+        rng = self.rng
+        low, high = NUMBER_RANGES[self.difficulty]
+        form = rng.randrange(3)
+
+        if form == 0:
+            step = rng.randint(2, 3 + 2 * self.difficulty) * rng.choice((1, -1))
+            start = rng.randint(low, high * 3)
+            if step < 0:
+                start += -step * 5
+            terms = [start + step * i for i in range(5)]
+        elif form == 1:
+            ratio = rng.randint(2, 2 + self.difficulty // 2)
+            start = rng.randint(1, low + 5)
+            terms = [start * ratio ** i for i in range(5)]
+        else:
+            start, add = rng.randint(1, low), rng.randint(1, self.difficulty + 1)
+            terms = [start]
+            for _ in range(4):
+                terms.append(terms[-1] * 2 + add)
+
+        question = ", ".join(str(term) for term in terms[:4])
+        return make_puzzle("numbers", f"{question}, ...?", terms[4])
+
+    def letter_sequence(self) -> dict:
+        """Буквы русского алфавита с постоянным шагом, например 'А, Б, В, Г, ...?'"""
+        rng = self.rng
+        step = rng.randint(1, LETTER_STEPS[self.difficulty]) * rng.choice((1, -1))
+        span = abs(step) * 4
+
+        # Отрезок алфавита не должен задевать Ё, Ъ, Ы, Ь
+        while True:
+            low = rng.randrange(len(RUSSIAN_ALPHABET) - span)
+            if not CONFUSING_LETTERS.intersection(RUSSIAN_ALPHABET[low:low + span + 1]):
+                break
+        start = low + span if step < 0 else low
+
+        letters = [RUSSIAN_ALPHABET[start + step * i] for i in range(5)]
+        return make_puzzle("letters", f"{', '.join(letters[:4])}, ...?", letters[4])
+
+    def word_sequence(self) -> dict:
+        """Словесная головоломка из банка (их нельзя сгенерировать)"""
+        puzzle = self.rng.choice(self.word_bank)
+        return make_puzzle("logic", puzzle["question"], puzzle["answer"])
+
+
+class PuzzlePool:
+    """Кольцевой буфер заранее сгенерированных головоломок.
+
+    Буфер пополняется пачками вне горячего пути, а take() лишь снимает
+    готовую головоломку с головы буфера.
+    """
+
+    def __init__(self, generator: PuzzleGenerator, size: int = PUZZLE_POOL_SIZE):
+        self.generator = generator
+        self.size = size
+        self._buffer = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def refill(self):
+        """Догенерировать головоломки до полного буфера"""
+        generate = self.generator.generate
+        self._buffer.extend(generate() for _ in range(self.size - len(self._buffer)))
+
+    def take(self) -> dict:
+        """Готовая головоломка из буфера"""
+        if not self._buffer:
+            self.refill()
+        return self._buffer.popleft()
@@ -0,0 +1,416 @@
+"""Исходный банк головоломок.
+
+Бот этот модуль не импортирует: python puzzle_bank.py собирает из него
+упакованный файл без повторов, который читается через mmap.
+"""
+
+MATH_PUZZLES = [
+    {"question": "15 * 3 + 10 = ?", "answer": "55"},
+    {"question": "(18 * 4) - 22 = ?", "answer": "50"},
+    {"question": "120 / 6 + 15 = ?", "answer": "35"},
+    {"question": "¾ от 100 = ?", "answer": "75"},
+    {"question": "25 * 4 - 38 = ?", "answer": "62"},
+    {"question": "64 / 8 * 3 = ?", "answer": "24"},
+    {"question": "17 + 29 - 15 = ?", "answer": "31"},
+    {"question": "50 * 2 + 45 = ?", "answer": "145"},
+    {"question": "100 - 35 + 17 = ?", "answer": "82"},
+    {"question": "12 * 6 - 18 = ?", "answer": "54"},
+    {"question": "81 / 9 + 23 = ?", "answer": "32"},
+    {"question": "⅗ от 50 = ?", "answer": "30"},
+    {"question": "28 + 47 - 35 = ?", "answer": "40"},
+    {"question": "15 * 5 - 25 = ?", "answer": "50"},
+    {"question": "90 / 3 + 12 = ?", "answer": "42"},
+    {"question": "44 + 56 - 30 = ?", "answer": "70"},
+    {"question": "7 * 9 + 13 = ?", "answer": "76"},
+    {"question": "150 / 5 - 15 = ?", "answer": "15"},
+    {"question": "38 + 22 - 18 = ?", "answer": "42"},
+    {"question": "13 * 4 + 8 = ?", "answer": "60"},
+    {"question": "72 / 8 * 5 = ?", "answer": "45"},
+    {"question": "29 + 38 - 22 = ?", "answer": "45"},
+    {"question": "16 * 3 + 12 = ?", "answer": "60"},
+    {"question": "⅔ от 90 = ?", "answer": "60"},
+    {"question": "55 + 27 - 35 = ?", "answer": "47"},
+    {"question": "24 * 2 - 18 = ?", "answer": "30"},
+    {"question": "96 / 6 + 14 = ?", "answer": "30"},
+    {"question": "33 + 44 - 29 = ?", "answer": "48"},
+    {"question": "18 * 4 - 25 = ?", "answer": "47"},
+    {"question": "84 / 7 * 3 = ?", "answer": "36"},
+    {"question": "45 + 38 - 42 = ?", "answer": "41"},
+    {"question": "27 * 2 + 16 = ?", "answer": "70"},
+    {"question": "144 / 12 + 18 = ?", "answer": "30"},
+    {"question": "39 + 47 - 28 = ?", "answer": "58"},
+    {"question": "32 * 2 - 24 = ?", "answer": "40"},
+    {"question": "75 / 5 * 4 = ?", "answer": "60"},
+    {"question": "26 + 39 - 33 = ?", "answer": "32"},
+    {"question": "19 * 3 + 23 = ?", "answer": "80"},
+    {"question": "88 / 8 + 27 = ?", "answer": "38"},
+    {"question": "51 + 29 - 45 = ?", "answer": "35"},
+    {"question": "14 * 5 - 18 = ?", "answer": "52"},
+    {"question": "63 / 7 * 6 = ?", "answer": "54"},
+    {"question": "37 + 48 - 39 = ?", "answer": "46"},
+    {"question": "22 * 3 + 14 = ?", "answer": "80"},
+    {"question": "108 / 9 + 32 = ?", "answer": "44"},
+    {"question": "42 + 53 - 47 = ?", "answer": "48"},
+    {"question": "31 * 2 - 28 = ?", "answer": "34"},
+    {"question": "52 / 4 * 5 = ?", "answer": "65"},
+    {"question": "58 + 37 - 44 = ?", "answer": "51"},
+    {"question": "23 * 3 + 19 = ?", "answer": "88"},
+    {"question": "132 / 11 + 25 = ?", "answer": "37"},
+    {"question": "47 + 39 - 52 = ?", "answer": "34"},
+    {"question": "35 * 2 - 42 = ?", "answer": "28"},
+    {"question": "68 / 4 * 3 = ?", "answer": "51"},
+    {"question": "63 + 28 - 57 = ?", "answer": "34"},
+    {"question": "26 * 3 + 22 = ?", "answer": "100"},
+    {"question": "156 / 12 + 18 = ?", "answer": "31"},
+    {"question": "54 + 47 - 61 = ?", "answer": "40"},
+    {"question": "29 * 2 - 38 = ?", "answer": "20"},
+    {"question": "76 / 4 * 5 = ?", "answer": "95"},
+    {"question": "72 + 39 - 68 = ?", "answer": "43"},
+    {"question": "33 * 3 + 17 = ?", "answer": "116"},
+    {"question": "168 / 14 + 22 = ?", "answer": "34"},
+    {"question": "68 + 45 - 73 = ?", "answer": "40"},
+    {"question": "37 * 2 - 44 = ?", "answer": "30"},
+    {"question": "84 / 6 * 7 = ?", "answer": "98"},
+    {"question": "79 + 38 - 82 = ?", "answer": "35"},
+    {"question": "41 * 2 + 28 = ?", "answer": "110"},
+    {"question": "180 / 15 + 26 = ?", "answer": "38"},
+    {"question": "85 + 47 - 89 = ?", "answer": "43"},
+    {"question": "44 * 2 - 52 = ?", "answer": "36"},
+    {"question": "92 / 4 * 3 = ?", "answer": "69"},
+    {"question": "91 + 39 - 94 = ?", "answer": "36"},
+    {"question": "48 * 2 + 34 = ?", "answer": "130"},
+    {"question": "192 / 16 + 28 = ?", "answer": "40"},
+    {"question": "76 + 58 - 87 = ?", "answer": "47"},
+    {"question": "52 * 2 - 64 = ?", "answer": "40"},
+    {"question": "104 / 8 * 5 = ?", "answer": "65"},
+    {"question": "88 + 49 - 92 = ?", "answer": "45"},
+    {"question": "56 * 2 + 42 = ?", "answer": "154"},
+    {"question": "204 / 17 + 30 = ?", "answer": "42"},
+    {"question": "94 + 57 - 98 = ?", "answer": "53"},
+    {"question": "61 * 2 - 72 = ?", "answer": "50"},
+    {"question": "116 / 4 * 3 = ?", "answer": "87"},
+    {"question": "82 + 68 - 95 = ?", "answer": "55"},
+    {"question": "67 * 2 + 48 = ?", "answer": "182"},
+    {"question": "216 / 18 + 32 = ?", "answer": "44"},
+    {"question": "73 + 79 - 102 = ?", "answer": "50"},
+    {"question": "72 * 2 - 84 = ?", "answer": "60"},
+    {"question": "128 / 8 * 7 = ?", "answer": "112"},
+    {"question": "95 + 84 - 113 = ?", "answer": "66"},
+    {"question": "78 * 2 + 56 = ?", "answer": "212"},
+    {"question": "228 / 19 + 34 = ?", "answer": "46"},
+    {"question": "87 + 92 - 118 = ?", "answer": "61"},
+    {"question": "83 * 2 - 96 = ?", "answer": "70"},
+    {"question": "140 / 7 * 6 = ?", "answer": "120"},
+    {"question": "99 + 87 - 125 = ?", "answer": "61"}
+]
+
+LETTER_SEQUENCES = [
+    {"question": "А, Б, В, Г, ...?", "answer": "Д"},
+    {"question": "А, В, Г, Д, ...?", "answer": "Е"},
+    {"question": "Я, Ю, Э, ...?", "answer": "Ы"},
+    {"question": "О, П, Р, С, ...?", "answer": "Т"},
+    {"question": "Е, Ё, Ж, З, ...?", "answer": "И"},
+    {"question": "М, Н, О, П, ...?", "answer": "Р"},
+    {"question": "У, Ф, Х, Ц, ...?", "answer": "Ч"},
+    {"question": "К, Л, М, Н, ...?", "answer": "О"},
+    {"question": "Т, У, Ф, Х, ...?", "answer": "Ц"},
+    {"question": "Д, Е, Ё, Ж, ...?", "answer": "З"},
+    {"question": "П, Р, С, Т, ...?", "answer": "У"},
+    {"question": "Ч, Ш, Щ, Ъ, ...?", "answer": "Ы"},
+    {"question": "Э, Ю, Я, А, ...?", "answer": "Б"},
+    {"question": "Ж, З, И, Й, ...?", "answer": "К"},
+    {"question": "Ц, Ч, Ш, Щ, ...?", "answer": "Ъ"},
+    {"question": "Б, В, Г, Д, ...?", "answer": "Е"},
+    {"question": "Р, С, Т, У, ...?", "answer": "Ф"},
+    {"question": "Х, Ц, Ч, Ш, ...?", "answer": "Щ"},
+    {"question": "Й, К, Л, М, ...?", "answer": "Н"},
+    {"question": "Ф, Х, Ц, Ч, ...?", "answer": "Ш"},
+    {"question": "Щ, Ъ, Ы, Ь, ...?", "answer": "Э"},
+    {"question": "Г, Д, Е, Ё, ...?", "answer": "Ж"},
+    {"question": "Л, М, Н, О, ...?", "answer": "П"},
+    {"question": "С, Т, У, Ф, ...?", "answer": "Х"},
+    {"question": "Ш, Щ, Ъ, Ы, ...?", "answer": "Ь"},
+    {"question": "В, Г, Д, Е, ...?", "answer": "Ё"},
+    {"question": "Н, О, П, Р, ...?", "answer": "С"},
+    {"question": "У, Ф, Х, Ц, ...?", "answer": "Ч"},
+    {"question": "Ы, Ь, Э, Ю, ...?", "answer": "Я"},
+    {"question": "Д, Е, Ё, Ж, ...?", "answer": "З"},
+    {"question": "О, П, Р, С, ...?", "answer": "Т"},
+    {"question": "Ф, Х, Ц, Ч, ...?", "answer": "Ш"},
+    {"question": "Ь, Э, Ю, Я, ...?", "answer": "А"},
+    {"question": "Е, Ё, Ж, З, ...?", "answer": "И"},
+    {"question": "П, Р, С, Т, ...?", "answer": "У"},
+    {"question": "Х, Ц, Ч, Ш, ...?", "answer": "Щ"},
+    {"question": "Э, Ю, Я, А, ...?", "answer": "Б"},
+    {"question": "Ё, Ж, З, И, ...?", "answer": "Й"},
+    {"question": "Р, С, Т, У, ...?", "answer": "Ф"},
+    {"question": "Ц, Ч, Ш, Щ, ...?", "answer": "Ъ"},
+    {"question": "Ю, Я, А, Б, ...?", "answer": "В"},
+    {"question": "Ж, З, И, Й, ...?", "answer": "К"},
+    {"question": "С, Т, У, Ф, ...?", "answer": "Х"},
+    {"question": "Ч, Ш, Щ, Ъ, ...?", "answer": "Ы"},
+    {"question": "Я, А, Б, В, ...?", "answer": "Г"},
+    {"question": "З, И, Й, К, ...?", "answer": "Л"},
+    {"question": "Т, У, Ф, Х, ...?", "answer": "Ц"},
+    {"question": "Ш, Щ, Ъ, Ы, ...?", "answer": "Ь"},
+    {"question": "А, Б, В, Г, ...?", "answer": "Д"},
+    {"question": "И, Й, К, Л, ...?", "answer": "М"},
+    {"question": "У, Ф, Х, Ц, ...?", "answer": "Ч"},
+    {"question": "Щ, Ъ, Ы, Ь, ...?", "answer": "Э"},
+    {"question": "Б, В, Г, Д, ...?", "answer": "Е"},
+    {"question": "Й, К, Л, М, ...?", "answer": "Н"},
+    {"question": "Ф, Х, Ц, Ч, ...?", "answer": "Ш"},
+    {"question": "Ъ, Ы, Ь, Э, ...?", "answer": "Ю"},
+    {"question": "В, Г, Д, Е, ...?", "answer": "Ё"},
+    {"question": "К, Л, М, Н, ...?", "answer": "О"},
+    {"question": "Х, Ц, Ч, Ш, ...?", "answer": "Щ"},
+    {"question": "Ы, Ь, Э, Ю, ...?", "answer": "Я"},
+    {"question": "Г, Д, Е, Ё, ...?", "answer": "Ж"},
+    {"question": "Л, М, Н, О, ...?", "answer": "П"},
+    {"question": "Ц, Ч, Ш, Щ, ...?", "answer": "Ъ"},
+    {"question": "Ь, Э, Ю, Я, ...?", "answer": "А"},
+    {"question": "Д, Е, Ё, Ж, ...?", "answer": "З"},
+    {"question": "М, Н, О, П, ...?", "answer": "Р"},
+    {"question": "Ч, Ш, Щ, Ъ, ...?", "answer": "Ы"},
+    {"question": "Э, Ю, Я, А, ...?", "answer": "Б"},
+    {"question": "Е, Ё, Ж, З, ...?", "answer": "И"},
+    {"question": "Н, О, П, Р, ...?", "answer": "С"},
+    {"question": "Ш, Щ, Ъ, Ы, ...?", "answer": "Ь"},
+    {"question": "Ю, Я, А, Б, ...?", "answer": "В"},
+    {"question": "Ё, Ж, З, И, ...?", "answer": "Й"},
+    {"question": "О, П, Р, С, ...?", "answer": "Т"},
+    {"question": "Щ, Ъ, Ы, Ь, ...?", "answer": "Э"},
+    {"question": "Я, А, Б, В, ...?", "answer": "Г"},
+    {"question": "Ж, З, И, Й, ...?", "answer": "К"},
+    {"question": "П, Р, С, Т, ...?", "answer": "У"},
+    {"question": "Ъ, Ы, Ь, Э, ...?", "answer": "Ю"},
+    {"question": "А, Б, В, Г, ...?", "answer": "Д"},
+    {"question": "З, И, Й, К, ...?", "answer": "Л"},
+    {"question": "Р, С, Т, У, ...?", "answer": "Ф"},
+    {"question": "Ы, Ь, Э, Ю, ...?", "answer": "Я"},
+    {"question": "Б, В, Г, Д, ...?", "answer": "Е"},
+    {"question": "И, Й, К, Л, ...?", "answer": "М"},
+    {"question": "С, Т, У, Ф, ...?", "answer": "Х"},
+    {"question": "Ь, Э, Ю, Я, ...?", "answer": "А"},
+    {"question": "В, Г, Д, Е, ...?", "answer": "Ё"},
+    {"question": "Й, К, Л, М, ...?", "answer": "Н"},
+    {"question": "Т, У, Ф, Х, ...?", "answer": "Ц"},
+    {"question": "Э, Ю, Я, А, ...?", "answer": "Б"},
+    {"question": "Г, Д, Е, Ё, ...?", "answer": "Ж"},
+    {"question": "К, Л, М, Н, ...?", "answer": "О"},
+    {"question": "У, Ф, Х, Ц, ...?", "answer": "Ч"},
+    {"question": "Ю, Я, А, Б, ...?", "answer": "В"},
+    {"question": "Д, Е, Ё, Ж, ...?", "answer": "З"},
+    {"question": "Л, М, Н, О, ...?", "answer": "П"},
+    {"question": "Ф, Х, Ц, Ч, ...?", "answer": "Ш"},
+    {"question": "Я, А, Б, В, ...?", "answer": "Г"}
+]
+
+NUMBER_SEQUENCES = [
+    {"question": "2, 4, 8, 16, ...?", "answer": "32"},
+    {"question": "5, 11, 23, 47, ...?", "answer": "95"},
+    {"question": "100, 90, 81, 73, ...?", "answer": "66"},
+    {"question": "3, 6, 12, 24, ...?", "answer": "48"},
+    {"question": "10, 20, 40, 80, ...?", "answer": "160"},
+    {"question": "50, 45, 41, 38, ...?", "answer": "36"},
+    {"question": "1, 4, 9, 16, ...?", "answer": "25"},
+    {"question": "2, 5, 10, 17, ...?", "answer": "26"},
+    {"question": "15, 30, 60, 120, ...?", "answer": "240"},
+    {"question": "100, 95, 85, 70, ...?", "answer": "50"},
+    {"question": "7, 14, 28, 56, ...?", "answer": "112"},
+    {"question": "12, 24, 48, 96, ...?", "answer": "192"},
+    {"question": "80, 75, 71, 68, ...?", "answer": "66"},
+    {"question": "1, 3, 7, 15, ...?", "answer": "31"},
+    {"question": "10, 11, 13, 16, ...?", "answer": "20"},
+    {"question": "4, 8, 16, 32, ...?", "answer": "64"},
+    {"question": "20, 23, 26, 29, ...?", "answer": "32"},
+    {"question": "6, 12, 24, 48, ...?", "answer": "96"},
+    {"question": "25, 22, 19, 16, ...?", "answer": "13"},
+    {"question": "1, 2, 4, 8, ...?", "answer": "16"},
+    {"question": "30, 27, 24, 21, ...?", "answer": "18"},
+    {"question": "8, 16, 32, 64, ...?", "answer": "128"},
+    {"question": "40, 38, 36, 34, ...?", "answer": "32"},
+    {"question": "9, 18, 36, 72, ...?", "answer": "144"},
+    {"question": "15, 14, 12, 9, ...?", "answer": "5"},
+    {"question": "11, 22, 44, 88, ...?", "answer": "176"},
+    {"question": "60, 57, 54, 51, ...?", "answer": "48"},
+    {"question": "13, 26, 52, 104, ...?", "answer": "208"},
+    {"question": "35, 33, 31, 29, ...?", "answer": "27"},
+    {"question": "17, 34, 68, 136, ...?", "answer": "272"},
+    {"question": "70, 67, 64, 61, ...?", "answer": "58"},
+    {"question": "19, 38, 76, 152, ...?", "answer": "304"},
+    {"question": "45, 43, 41, 39, ...?", "answer": "37"},
+    {"question": "21, 42, 84, 168, ...?", "answer": "336"},
+    {"question": "55, 53, 51, 49, ...?", "answer": "47"},
+    {"question": "23, 46, 92, 184, ...?", "answer": "368"},
+    {"question": "65, 63, 61, 59, ...?", "answer": "57"},
+    {"question": "25, 50, 100, 200, ...?", "answer": "400"},
+    {"question": "75, 73, 71, 69, ...?", "answer": "67"},
+    {"question": "27, 54, 108, 216, ...?", "answer": "432"},
+    {"question": "85, 83, 81, 79, ...?", "answer": "77"},
+    {"question": "29, 58, 116, 232, ...?", "answer": "464"},
+    {"question": "95, 93, 91, 89, ...?", "answer": "87"},
+    {"question": "31, 62, 124, 248, ...?", "answer": "496"},
+    {"question": "105, 103, 101, 99, ...?", "answer": "97"},
+    {"question": "33, 66, 132, 264, ...?", "answer": "528"},
+    {"question": "115, 113, 111, 109, ...?", "answer": "107"},
+    {"question": "35, 70, 140, 280, ...?", "answer": "560"},
+    {"question": "125, 123, 121, 119, ...?", "answer": "117"},
+    {"question": "37, 74, 148, 296, ...?", "answer": "592"},
+    {"question": "135, 133, 131, 129, ...?", "answer": "127"},
+    {"question": "39, 78, 156, 312, ...?", "answer": "624"},
+    {"question": "145, 143, 141, 139, ...?", "answer": "137"},
+    {"question": "41, 82, 164, 328, ...?", "answer": "656"},
+    {"question": "155, 153, 151, 149, ...?", "answer": "147"},
+    {"question": "43, 86, 172, 344, ...?", "answer": "688"},
+    {"question": "165, 163, 161, 159, ...?", "answer": "157"},
+    {"question": "45, 90, 180, 360, ...?", "answer": "720"},
+    {"question": "175, 173, 171, 169, ...?", "answer": "167"},
+    {"question": "47, 94, 188, 376, ...?", "answer": "752"},
+    {"question": "185, 183, 181, 179, ...?", "answer": "177"},
+    {"question": "49, 98, 196, 392, ...?", "answer": "784"},
+    {"question": "195, 193, 191, 189, ...?", "answer": "187"},
+    {"question": "51, 102, 204, 408, ...?", "answer": "816"},
+    {"question": "205, 203, 201, 199, ...?", "answer": "197"},
+    {"question": "53, 106, 212, 424, ...?", "answer": "848"},
+    {"question": "215, 213, 211, 209, ...?", "answer": "207"},
+    {"question": "55, 110, 220, 440, ...?", "answer": "880"},
+    {"question": "225, 223, 221, 219, ...?", "answer": "217"},
+    {"question": "57, 114, 228, 456, ...?", "answer": "912"},
+    {"question": "235, 233, 231, 229, ...?", "answer": "227"},
+    {"question": "59, 118, 236, 472, ...?", "answer": "944"},
+    {"question": "245, 243, 241, 239, ...?", "answer": "237"},
+    {"question": "61, 122, 244, 488, ...?", "answer": "976"},
+    {"question": "255, 253, 251, 249, ...?", "answer": "247"},
+    {"question": "63, 126, 252, 504, ...?", "answer": "1008"},
+    {"question": "265, 263, 261, 259, ...?", "answer": "257"},
+    {"question": "65, 130, 260, 520, ...?", "answer": "1040"},
+    {"question": "275, 273, 271, 269, ...?", "answer": "267"},
+    {"question": "67, 134, 268, 536, ...?", "answer": "1072"},
+    {"question": "285, 283, 281, 279, ...?", "answer": "277"},
+    {"question": "69, 138, 276, 552, ...?", "answer": "1104"},
+    {"question": "295, 293, 291, 289, ...?", "answer": "287"},
+    {"question": "71, 142, 284, 568, ...?", "answer": "1136"},
+    {"question": "305, 303, 301, 299, ...?", "answer": "297"},
+    {"question": "73, 146, 292, 584, ...?", "answer": "1168"},
+    {"question": "315, 313, 311, 309, ...?", "answer": "307"},
+    {"question": "75, 150, 300, 600, ...?", "answer": "1200"},
+    {"question": "325, 323, 321, 319, ...?", "answer": "317"},
+    {"question": "77, 154, 308, 616, ...?", "answer": "1232"},
+    {"question": "335, 333, 331, 329, ...?", "answer": "327"},
+    {"question": "79, 158, 316, 632, ...?", "answer": "1264"},
+    {"question": "345, 343, 341, 339, ...?", "answer": "337"},
+    {"question": "81, 162, 324, 648, ...?", "answer": "1296"},
+    {"question": "355, 353, 351, 349, ...?", "answer": "347"},
+    {"question": "83, 166, 332, 664, ...?", "answer": "1328"},
+    {"question": "365, 363, 361, 359, ...?", "answer": "357"}
+]
+
+LOGIC_SEQUENCES = [
+    {"question": "утро, день, вечер, ...?", "answer": "ночь"},
+    {"question": "понедельник, вторник, среда, ...?", "answer": "четверг"},
+    {"question": "январь, февраль, март, ...?", "answer": "апрель"},
+    {"question": "весна, лето, осень, ...?", "answer": "зима"},
+    {"question": "раз, два, три, ...?", "answer": "четыре"},
+    {"question": "плюс, минус, умножить, ...?", "answer": "разделить"},
+    {"question": "завтрак, обед, ужин, ...?", "answer": "перекус"},
+    {"question": "первый, второй, третий, ...?", "answer": "четвертый"},
+    {"question": "восток, запад, север, ...?", "answer": "юг"},
+    {"question": "пробуждение, завтрак, работа, ...?", "answer": "отдых"},
+    {"question": "понедельник, среда, пятница, ...?", "answer": "воскресенье"},
+    {"question": "утро, обед, вечер, ...?", "answer": "ночь"},
+    {"question": "январь, март, май, ...?", "answer": "июль"},
+    {"question": "понедельник, вторник, четверг, ...?", "answer": "пятница"},
+    {"question": "завтрак, обед, ужин, ...?", "answer": "десерт"},
+    {"question": "утро, день, ночь, ...?", "answer": "вечер"},
+    {"question": "понедельник, среда, пятница, ...?", "answer": "суббота"},
+    {"question": "январь, февраль, апрель, ...?", "answer": "май"},
+    {"question": "весна, лето, зима, ...?", "answer": "осень"},
+    {"question": "раз, два, четыре, ...?", "answer": "восемь"},
+    {"question": "плюс, минус, делить, ...?", "answer": "умножить"},
+    {"question": "завтрак, ужин, обед, ...?", "answer": "полдник"},
+    {"question": "первый, третий, пятый, ...?", "answer": "седьмой"},
+    {"question": "восток, юг, запад, ...?", "answer": "север"},
+    {"question": "пробуждение, работа, ужин, ...?", "answer": "сон"},
+    {"question": "понедельник, пятница, воскресенье, ...?", "answer": "среда"},
+    {"question": "утро, вечер, ночь, ...?", "answer": "день"},
+    {"question": "январь, апрель, июль, ...?", "answer": "октябрь"},
+    {"question": "понедельник, четверг, воскресенье, ...?", "answer": "среда"},
+    {"question": "завтрак, полдник, ужин, ...?", "answer": "обед"},
+    {"question": "утро, ночь, день, ...?", "answer": "вечер"},
+    {"question": "понедельник, воскресенье, суббота, ...?", "answer": "пятница"},
+    {"question": "январь, май, сентябрь, ...?", "answer": "январь"},
+    {"question": "весна, осень, лето, ...?", "answer": "зима"},
+    {"question": "раз, три, пять, ...?", "answer": "семь"},
+    {"question": "плюс, умножить, делить, ...?", "answer": "минус"},
+    {"question": "завтрак, обед, полдник, ...?", "answer": "ужин"},
+    {"question": "первый, четвертый, седьмой, ...?", "answer": "десятый"},
+    {"question": "восток, север, запад, ...?", "answer": "юг"},
+    {"question": "пробуждение, завтрак, ужин, ...?", "answer": "сон"},
+    {"question": "понедельник, среда, суббота, ...?", "answer": "вторник"},
+    {"question": "утро, день, вечер, ...?", "answer": "ночь"},
+    {"question": "январь, июнь, декабрь, ...?", "answer": "июль"},
+    {"question": "понедельник, пятница, вторник, ...?", "answer": "среда"},
+    {"question": "завтрак, ужин, обед, ...?", "answer": "полдник"},
+    {"question": "утро, ночь, вечер, ...?", "answer": "день"},
+    {"question": "понедельник, воскресенье, пятница, ...?", "answer": "вторник"},
+    {"question": "январь, сентябрь, май, ...?", "answer": "январь"},
+    {"question": "весна, зима, лето, ...?", "answer": "осень"},
+    {"question": "раз, четыре, семь, ...?", "answer": "десять"},
+    {"question": "плюс, делить, умножить, ...?", "answer": "минус"},
+    {"question": "завтрак, полдник, обед, ...?", "answer": "ужин"},
+    {"question": "первый, пятый, девятый, ...?", "answer": "тринадцатый"},
+    {"question": "восток, запад, юг, ...?", "answer": "север"},
+    {"question": "пробуждение, ужин, сон, ...?", "answer": "завтрак"},
+    {"question": "понедельник, суббота, среда, ...?", "answer": "пятница"},
+    {"question": "утро, вечер, день, ...?", "answer": "ночь"},
+    {"question": "январь, октябрь, июль, ...?", "answer": "апрель"},
+    {"question": "понедельник, вторник, пятница, ...?", "answer": "суббота"},
+    {"question": "завтрак, обед, десерт, ...?", "answer": "ужин"},
+    {"question": "утро, день, ночь, ...?", "answer": "вечер"},
+    {"question": "понедельник, четверг, суббота, ...?", "answer": "вторник"},
+    {"question": "январь, август, март, ...?", "answer": "октябрь"},
+    {"question": "весна, лето, осень, ...?", "answer": "зима"},
+    {"question": "раз, пять, девять, ...?", "answer": "тринадцать"},
+    {"question": "плюс, умножить, минус, ...?", "answer": "делить"},
+    {"question": "завтрак, ужин, полдник, ...?", "answer": "обед"},
+    {"question": "первый, шестой, одиннадцатый, ...?", "answer": "шестнадцатый"},
+    {"question": "восток, юг, север, ...?", "answer": "запад"},
+    {"question": "пробуждение, работа, обед, ...?", "answer": "ужин"},
+    {"question": "понедельник, воскресенье, четверг, ...?", "answer": "пятница"},
+    {"question": "утро, ночь, день, ...?", "answer": "вечер"},
+    {"question": "январь, декабрь, ноябрь, ...?", "answer": "октябрь"},
+    {"question": "понедельник, среда, воскресенье, ...?", "answer": "пятница"},
+    {"question": "завтрак, обед, ужин, ...?", "answer": "десерт"},
+    {"question": "утро, вечер, ночь, ...?", "answer": "день"},
+    {"question": "понедельник, пятница, вторник, ...?", "answer": "среда"},
+    {"question": "январь, июль, январь, ...?", "answer": "июль"},
+    {"question": "весна, осень, зима, ...?", "answer": "лето"},
+    {"question": "раз, шесть, одиннадцать, ...?", "answer": "шестнадцать"},
+    {"question": "плюс, делить, минус, ...?", "answer": "умножить"},
+    {"question": "завтрак, полдник, ужин, ...?", "answer": "обед"},
+    {"question": "первый, седьмой, тринадцатый, ...?", "answer": "девятнадцатый"},
+    {"question": "восток, север, юг, ...?", "answer": "запад"},
+    {"question": "пробуждение, завтрак, сон, ...?", "answer": "обед"},
+    {"question": "понедельник, суббота, четверг, ...?", "answer": "вторник"},
+    {"question": "утро, день, вечер, ...?", "answer": "ночь"},
+    {"question": "январь, апрель, октябрь, ...?", "answer": "июль"},
+    {"question": "понедельник, вторник, воскресенье, ...?", "answer": "пятница"},
+    {"question": "завтрак, ужин, обед, ...?", "answer": "полдник"},
+    {"question": "утро, ночь, вечер, ...?", "answer": "день"},
+    {"question": "понедельник, воскресенье, среда, ...?", "answer": "пятница"},
+    {"question": "январь, март, сентябрь, ...?", "answer": "декабрь"},
+    {"question": "весна, лето, зима, ...?", "answer": "осень"},
+    {"question": "раз, семь, тринадцать, ...?", "answer": "девятнадцать"},
+    {"question": "плюс, умножить, делить, ...?", "answer": "минус"},
+    {"question": "завтрак, обед, полдник, ...?", "answer": "ужин"},
+    {"question": "первый, восьмой, пятнадцатый, ...?", "answer": "двадцать второй"}
+]
+
+# Категории банка в порядке упаковки
+CATEGORIES = {
+    "math": MATH_PUZZLES,
+    "letters": LETTER_SEQUENCES,
+    "numbers": NUMBER_SEQUENCES,
+    "logic": LOGIC_SEQUENCES,
+}
@@ -0,0 +1,150 @@
+import heapq
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from config import logger, MAX_ALARM_LATENESS, DEFAULT_TIMEZONE
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class TimerQueue:
+    """Min-куча таймеров: не больше одного таймера на ключ"""
+
+    def __init__(self):
+        self._heap = []      # (at, key), устаревшие записи удаляются лениво
+        self._entries = {}   # key -> (at, payload)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, at, payload=None):
+        """Поставить (или переставить) таймер"""
+        self._entries[key] = (at, payload)
+        heapq.heappush(self._heap, (at, key))
+        self._compact()
+
+    def get(self, key):
+        """(at, payload) таймера или None"""
+        return self._entries.get(key)
+
+    def cancel(self, key):
+        """Снять таймер"""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Снять все таймеры"""
+        self._heap.clear()
+        self._entries.clear()
+
+    def timers(self):
+        """Все таймеры по возрастанию at: список (key, at, payload)"""
+        timers = [(key, at, payload) for key, (at, payload) in self._entries.items()]
+        timers.sort(key=lambda timer: timer[1])
+        return timers
+
+    def load(self, timers):
+        """Заменить все таймеры списком (key, at, payload).
+
+        Список, отсортированный по at (как его отдает timers()), уже является
+        кучей, поэтому загрузка миллиона таймеров не требует миллиона вставок.
+        """
+        self._entries = {key: (at, payload) for key, at, payload in timers}
+        self._heap = [(at, key) for key, at, _ in timers]
+        heapq.heapify(self._heap)
+
+    def pop_due(self, now):
+        """Извлечь наступившие таймеры по порядку: список (key, at, payload)"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != at:
+                continue
+            del self._entries[key]
+            due.append((key, at, entry[1]))
+        return due
+
+    def _compact(self):
+        # Перестраиваем кучу, когда устаревших записей стало больше актуальных
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(at, key) for key, (at, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+
+def user_zone(name: str = None) -> ZoneInfo:
+    """Часовой пояс пользователя; без выбранного - DEFAULT_TIMEZONE"""
+    return ZoneInfo(name or DEFAULT_TIMEZONE)
+
+
+def parse_zone(name: str):
+    """ZoneInfo по имени IANA или None, если такого пояса нет"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def local_instant(day: date, minute: int, zone: ZoneInfo) -> int:
+    """UTC epoch для минуты суток minute даты day по местному времени.
+
+    Несуществующее время (перевод часов вперед) сдвигается вперед на величину
+    перевода, а повторяющееся (перевод назад) берется в первый раз.
+    """
+    return int(datetime(day.year, day.month, day.day, minute // 60, minute % 60, tzinfo=zone).timestamp())
+
+
+def plan_fire_at(start_minute: int, wake_minute: int, zone: ZoneInfo, after: int) -> int:
+    """Момент пробуждения в ближайшем окне, которое начинается позже after.
+
+    Окно, переходящее через полночь (23:50 - 00:20), относится к дню своего
+    начала: время пробуждения раньше начала окна попадает на следующий день.
+    """
+    day = datetime.fromtimestamp(after, zone).date()
+    while local_instant(day, start_minute, zone) <= after:
+        day += timedelta(days=1)
+    if wake_minute < start_minute:
+        day += timedelta(days=1)
+    return local_instant(day, wake_minute, zone)
+
+
+def first_fire_at(start_minute: int, end_minute: int, wake_minute: int, zone: ZoneInfo, now: int) -> int:
+    """Момент пробуждения для нового будильника: в текущем окне, если время еще не прошло, иначе в следующем"""
+    window = (end_minute - start_minute) % MINUTES_PER_DAY * 60
+    fire_at = plan_fire_at(start_minute, wake_minute, zone, now - window - 1)
+    if fire_at <= now:
+        fire_at = plan_fire_at(start_minute, wake_minute, zone, now)
+    return fire_at
+
+
+class AlarmScheduler(TimerQueue):
+    """Планировщик будильников: min-куча по моменту срабатывания (UTC epoch).
+
+    В полезной нагрузке таймера хранится окно (start_minute, end_minute, zone),
+    чтобы после срабатывания сразу выбрать время на следующий день без запроса к базе.
+    """
+
+    def schedule_alarm(self, user_id: int, fire_at: int, window: tuple):
+        """Запланировать будильник на момент fire_at"""
+        self.schedule(user_id, fire_at, window)
+
+    def pop_due_alarms(self, now: int):
+        """Извлечь будильники, время которых наступило: (due, missed), списки (user_id, fire_at, window).
+
+        Пропущенные тики догоняются: в due попадают все будильники с моментом <= now,
+        если опоздание не превышает MAX_ALARM_LATENESS. Более старые уходят в missed -
+        их нужно только перенести на следующий день.
+        """
+        due, missed = [], []
+        oldest = now - MAX_ALARM_LATENESS
+
+        for user_id, fire_at, window in self.pop_due(now):
+            if fire_at < oldest:
+                logger.warning(f"Будильник {user_id} на {datetime.fromtimestamp(fire_at, window[2]):%H:%M} пропущен: опоздание больше допустимого")
+                missed.append((user_id, fire_at, window))
+                continue
+            due.append((user_id, fire_at, window))
+
+        return due, missed
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop, ContextTypes, TypeHandler
+
+from config import BOT_TOKEN, BOT_API_URL, SHARD_COUNT, STORAGE_BACKEND, DATABASE_PATH, logger
+from database import Database
+
+
+def shard_for(user_id: int, shard_count: int = SHARD_COUNT) -> int:
+    """Номер шарда, которому принадлежит пользователь"""
+    return user_id % shard_count
+
+
+def update_owner(update: Update) -> int:
+    """Идентификатор, по которому обновление направляется в шард"""
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return 0
+
+
+class ShardRouter:
+    """Пересылает обновления в процесс-шард, владеющий пользователем"""
+
+    def __init__(self, connections):
+        self.connections = connections
+
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        shard = shard_for(update_owner(update), len(self.connections))
+        self.connections[shard].send_bytes(json.dumps(update.to_dict()).encode())
+        raise ApplicationHandlerStop
+
+
+async def serve_shard(application: Application, connection):
+    """Обрабатывает обновления, приходящие от фронтового процесса, пока канал открыт"""
+    loop = asyncio.get_running_loop()
+    closed = asyncio.Event()
+
+    def on_readable():
+        try:
+            while connection.poll():
+                data = json.loads(connection.recv_bytes())
+                application.update_queue.put_nowait(Update.de_json(data, application.bot))
+        except EOFError:
+            loop.remove_reader(connection.fileno())
+            closed.set()
+
+    async with application:
+        await application.post_init(application)
+        await application.start()
+        loop.add_reader(connection.fileno(), on_readable)
+        await closed.wait()
+        await application.stop()
+    await application.post_shutdown(application)
+
+
+def run_worker(connection):
+    """Точка входа процесса-шарда"""
+    # Останавливается фронтовой процесс, шард завершается, когда закроется канал
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    from main import build_application
+
+    asyncio.run(serve_shard(build_application(with_updater=False), connection))
+
+
+def run_sharded(run_updates):
+    """Запускает SHARD_COUNT процессов-шардов и фронтовой процесс, который раздает им обновления"""
+    context = multiprocessing.get_context("spawn")
+    connections, workers = [], []
+
+    # Миграции применяет фронтовой процесс до запуска шардов: иначе шарды
+    # одновременно мигрируют новую базу и падают на чужих изменениях схемы
+    if STORAGE_BACKEND == "sqlite":
+        Database(DATABASE_PATH).close()
+
+    for index in range(SHARD_COUNT):
+        receiver, sender = context.Pipe(duplex=False)
+        # Шард узнает свой номер из окружения при импорте config
+        os.environ["SHARD_INDEX"] = str(index)
+        worker = context.Process(target=run_worker, args=(receiver,), name=f"shard-{index}")
+        worker.start()
+        receiver.close()
+        connections.append(sender)
+        workers.append(worker)
+    os.environ.pop("SHARD_INDEX", None)
+    logger.info(f"🧩 Запущено шардов: {SHARD_COUNT}")
+
+    front = Application.builder().token(BOT_TOKEN).base_url(BOT_API_URL).build()
+    front.add_handler(TypeHandler(Update, ShardRouter(connections).route))
+
+    try:
+        run_updates(front)
+    finally:
+        for connection in connections:
+            connection.close()
+        for worker in workers:
+            worker.join()
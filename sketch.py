@@ -0,0 +1,60 @@
+import math
+import struct
+
+# Относительная погрешность квантилей: 2% от значения
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 1e-3  # все, что меньше, попадает в одну корзину
+
+BIN = struct.Struct("<iI")  # номер корзины, сколько значений
+
+
+class QuantileSketch:
+    """Потоковая оценка квантилей без хранения выборки (логарифмические корзины, как в DDSketch).
+
+    Значение x попадает в корзину ceil(log_gamma(x)); квантиль возвращается с
+    относительной погрешностью RELATIVE_ACCURACY. Корзин - десятки на несколько
+    порядков значений, поэтому скетч легко хранить и сериализовать.
+    """
+
+    __slots__ = ("count", "_bins")
+
+    def __init__(self, bins=None):
+        self._bins = dict(bins or {})
+        self.count = sum(self._bins.values())
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value: float):
+        """Учесть одно положительное значение"""
+        index = math.ceil(math.log(max(value, MIN_VALUE)) / LOG_GAMMA)
+        self._bins[index] = self._bins.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch"):
+        """Добавить все значения другого скетча"""
+        for index, count in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + count
+        self.count += other.count
+
+    def quantile(self, q: float):
+        """Оценка квантиля q (0..1) или None, если значений нет"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if seen > rank:
+                break
+        # Середина корзины (gamma^(i-1), gamma^i] с учетом относительной погрешности
+        return 2 * GAMMA ** index / (GAMMA + 1)
+
+    def to_bytes(self) -> bytes:
+        return b"".join(BIN.pack(index, count) for index, count in self._bins.items())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        return cls(BIN.iter_unpack(data))
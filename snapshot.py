@@ -0,0 +1,174 @@
+"""Снимок планировщика для быстрого перезапуска.
+
+При остановке бот сохраняет то, что при запуске пришлось бы собирать из базы
+(будильники с окнами, незавершенные сценарии с дедлайнами), и то, чего в базе
+нет вовсе (категория и момент доставки головоломки, время решения первой,
+примеры головоломок):
+
+    заголовок    magic, версия, число шардов, номер шарда, когда снят (epoch), будильников, длина JSON
+    будильники   user_id и next_fire_at (int64), номер окна (uint32) - три массива по возрастанию next_fire_at
+    остальное    JSON, сжатый zlib: окна [start, end, пояс или null], сценарии, примеры, отпечатки
+
+Отпечатки - число строк и сумма контрольных сумм строк (database.row_checksum)
+по часовым поясам будильников и по состояниям сценариев, как их считает
+Storage.get_fingerprints; при запуске они сверяются с базой, и разошедшаяся
+часть загружается из базы. Пояс по умолчанию хранится как null и при запуске
+означает текущий DEFAULT_TIMEZONE - как у пользователей без пояса в базе.
+Снимок одноразовый: read_snapshot удаляет файл, чтобы после аварийного
+перезапуска не поднять устаревшее состояние.
+"""
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from config import logger, DEFAULT_TIMEZONE
+from database import add_fingerprint
+from scheduler import user_zone
+from wake_flow import Session, WakeState, STATE_NAMES
+
+MAGIC = b"ALSN"
+VERSION = 2
+HEADER = struct.Struct("<4sHHHdQI")  # magic, версия, шардов, номер шарда, когда снят, будильников, длина JSON
+COLUMNS = "qqI"                      # user_id, next_fire_at, номер окна
+
+
+def stored_zone(zone) -> str:
+    """Имя пояса для снимка; пояс по умолчанию - None"""
+    return None if zone.key == DEFAULT_TIMEZONE else zone.key
+
+
+def alarm_fingerprint(timers) -> list:
+    """Отпечаток будильников (user_id, fire_at, window): [[пояс или None, число, сумма контрольных сумм]]"""
+    fingerprint = {}
+    for user_id, fire_at, (start_minute, end_minute, zone) in timers:
+        add_fingerprint(fingerprint, stored_zone(zone), user_id, fire_at, start_minute, end_minute)
+    return [[zone, count, total] for zone, (count, total) in fingerprint.items()]
+
+
+def session_fingerprint(sessions) -> list:
+    """Отпечаток сценариев (user_id, Session, deadline_at): [[состояние, число, сумма контрольных сумм]]"""
+    fingerprint = {}
+    for user_id, session, _ in sessions:
+        add_fingerprint(fingerprint, STATE_NAMES[session.state], user_id)
+    return [[state, count, total] for state, (count, total) in fingerprint.items()]
+
+
+def resolve_fingerprint(rows) -> dict:
+    """{группа: (число, сумма)} из отпечатка снимка; None - текущий пояс по умолчанию"""
+    fingerprint = {}
+    for group, count, total in rows:
+        group = DEFAULT_TIMEZONE if group is None else group
+        previous_count, previous_total = fingerprint.get(group, (0, 0))
+        fingerprint[group] = (previous_count + count, previous_total + total)
+    return fingerprint
+
+
+class Snapshot:
+    """Прочитанный снимок"""
+
+    def __init__(self, written_at: float, columns, body: dict):
+        self.written_at = written_at
+        self._user_ids, self._fire_ats, self._window_ids = columns
+        self._windows = body['windows']
+        self._sessions = body['sessions']
+        self._examples = body['examples']
+        self.alarm_fingerprint, self.session_fingerprint = (resolve_fingerprint(rows) for rows in body['fingerprints'])
+
+    def alarms(self):
+        """Будильники по возрастанию срабатывания: список (user_id, fire_at, window)"""
+        windows = [(start_minute, end_minute, user_zone(zone)) for start_minute, end_minute, zone in self._windows]
+        return list(zip(self._user_ids, self._fire_ats, map(windows.__getitem__, self._window_ids)))
+
+    def sessions(self):
+        """Незавершенные сценарии: список (user_id, Session, deadline_at)"""
+        return [
+            (user_id, Session(WakeState(state), question, answer, category, sent_at, solve_time_1), deadline_at)
+            for user_id, state, deadline_at, question, answer, category, sent_at, solve_time_1 in self._sessions
+        ]
+
+    def examples(self) -> dict:
+        """Примеры головоломок, которые пользователи еще не решили: user_id -> {'question', 'answer'}"""
+        return {user_id: {'question': question, 'answer': answer} for user_id, question, answer in self._examples}
+
+
+def save_snapshot(path: str, scheduler, wake_flow, examples: dict, shard_count: int = 1, shard_index: int = 0) -> int:
+    """Записать снимок планировщика, сценариев и примеров головоломок; вернуть размер файла.
+
+    Файл заменяется атомарно: оборванная запись не оставит половину снимка.
+    """
+    started = time.perf_counter()
+    timers = scheduler.timers()
+    window_ids = {}
+    columns = tuple(array(typecode) for typecode in COLUMNS)
+    user_ids, fire_ats, windows = columns
+    for user_id, fire_at, window in timers:
+        user_ids.append(user_id)
+        fire_ats.append(fire_at)
+        windows.append(window_ids.setdefault(window, len(window_ids)))
+
+    live = wake_flow.export_sessions()
+    sessions = [
+        [user_id, int(session.state), deadline_at,
+         session.question, session.answer, session.category, session.sent_at, session.solve_time_1]
+        for user_id, session, deadline_at in live
+    ]
+    body = zlib.compress(json.dumps({
+        'windows': [[start_minute, end_minute, stored_zone(zone)] for start_minute, end_minute, zone in window_ids],
+        'sessions': sessions,
+        'examples': [[user_id, puzzle['question'], puzzle['answer']] for user_id, puzzle in examples.items()],
+        'fingerprints': [alarm_fingerprint(timers), session_fingerprint(live)],
+    }, ensure_ascii=False).encode())
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, shard_count, shard_index, time.time(), len(timers), len(body)))
+        for column in columns:
+            if sys.byteorder == "big":
+                column.byteswap()
+            column.tofile(f)
+        f.write(body)
+    os.replace(temporary, path)
+
+    size = os.path.getsize(path)
+    logger.info(f"💾 Снимок планировщика сохранен в {path}: будильников {len(timers)}, сценариев {len(sessions)}, "
+                f"примеров {len(examples)}, {size} байт за {(time.perf_counter() - started) * 1000:.0f} мс")
+    return size
+
+
+def read_snapshot(path: str, shard_count: int = 1, shard_index: int = 0):
+    """Прочитать и удалить снимок; None, если его нет, он поврежден или снят при другой раскладке шардов"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    os.remove(path)
+
+    try:
+        magic, version, count, index, written_at, alarms, body_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"не снимок версии {VERSION}")
+        if (count, index) != (shard_count, shard_index):
+            logger.warning(f"⚠️ Снимок {path} снят для шарда {index} из {count}, загружаю все из базы")
+            return None
+
+        offset = HEADER.size
+        columns = []
+        for typecode in COLUMNS:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + alarms * column.itemsize])
+            if len(column) != alarms:
+                raise ValueError("файл обрезан")
+            if sys.byteorder == "big":
+                column.byteswap()
+            offset += alarms * column.itemsize
+            columns.append(column)
+        body = json.loads(zlib.decompress(data[offset:offset + body_size]))
+        return Snapshot(written_at, columns, body)
+    except (struct.error, zlib.error, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"⚠️ Снимок {path} не прочитан ({e}), загружаю все из базы")
+        return None
@@ -0,0 +1,90 @@
+from cache import LRUCache, MISSING
+from config import SOLVE_SKETCH_CACHE_SIZE, SHARD_INDEX
+from metrics import watch_cache
+from sketch import QuantileSketch
+
+USER_SCOPE = "user"
+CATEGORY_SCOPE = "category"
+
+
+class SolveTimes:
+    """Квантили времени решения головоломок по пользователям и по категориям.
+
+    Каждое решение добавляется в скетч пользователя и скетч категории, и оба
+    сохраняются через отложенную запись. Скетчи категорий загружаются при
+    запуске целиком, пользователей - по требованию в LRU-кеш; отчет строится
+    без просмотра истории statistics.
+
+    Категории общие для всех шардов, поэтому каждый шард пишет свою строку
+    "категория@номер шарда" и не затирает чужие; отчет по категории сливает
+    свой скетч со скетчами остальных шардов на момент загрузки.
+    """
+
+    def __init__(self, db, cache_size: int = SOLVE_SKETCH_CACHE_SIZE, shard_index: int = SHARD_INDEX):
+        self.db = db
+        self.shard_index = shard_index
+        self.users = watch_cache("solve_sketch", LRUCache(cache_size))
+        self.categories = {}     # категория -> QuantileSketch этого шарда
+        self._other_shards = {}  # категория -> QuantileSketch остальных шардов (и строк без номера шарда)
+
+    async def load(self):
+        """Загрузить скетчи категорий: свой шард отдельно, остальные - слитыми"""
+        self.categories, self._other_shards = {}, {}
+        for key, data in await self.db.get_sketches(CATEGORY_SCOPE):
+            category, _, shard = key.rpartition("@") if "@" in key else (key, None, None)
+            target = self.categories if shard == str(self.shard_index) else self._other_shards
+            target.setdefault(category, QuantileSketch()).merge(QuantileSketch.from_bytes(data))
+
+    async def user_sketch(self, user_id: int) -> QuantileSketch:
+        """Скетч пользователя (пустой, если решений еще не было)"""
+        sketch = self.users.get(user_id)
+        if sketch is MISSING:
+            data = await self.db.get_sketch(USER_SCOPE, str(user_id))
+            sketch = QuantileSketch.from_bytes(data) if data else QuantileSketch()
+            self.users.put(user_id, sketch)
+        return sketch
+
+    async def record(self, user_id: int, category: str, seconds: float):
+        """Учесть решение головоломки категории category (None - категория неизвестна)"""
+        sketch = await self.user_sketch(user_id)
+        sketch.add(seconds)
+        await self.db.save_sketch(USER_SCOPE, str(user_id), sketch.to_bytes())
+
+        if category:
+            sketch = self.categories.setdefault(category, QuantileSketch())
+            sketch.add(seconds)
+            await self.db.save_sketch(CATEGORY_SCOPE, category_key(category, self.shard_index), sketch.to_bytes())
+
+    async def user_summary(self, user_id: int):
+        """(решений, медиана, 90-й перцентиль) в секундах или None, если решений нет"""
+        return summary(await self.user_sketch(user_id))
+
+    def category_summary(self, category: str):
+        """То же для категории головоломок по всем шардам"""
+        sketch = QuantileSketch()
+        for part in (self.categories.get(category), self._other_shards.get(category)):
+            if part:
+                sketch.merge(part)
+        return summary(sketch)
+
+    def category_quantiles(self) -> dict:
+        """Медиана и 90-й перцентиль по категориям для метрик: {(категория, квантиль): секунды}"""
+        quantiles = {}
+        for category in self.categories.keys() | self._other_shards.keys():
+            result = self.category_summary(category)
+            if result:
+                _, p50, p90 = result
+                quantiles[category, "0.5"] = p50
+                quantiles[category, "0.9"] = p90
+        return quantiles
+
+
+def category_key(category: str, shard_index: int) -> str:
+    """Ключ скетча категории в solve_sketches: у каждого шарда своя строка"""
+    return f"{category}@{shard_index}"
+
+
+def summary(sketch: QuantileSketch):
+    if not sketch.count:
+        return None
+    return sketch.count, sketch.quantile(0.5), sketch.quantile(0.9)
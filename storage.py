@@ -0,0 +1,254 @@
+from datetime import date, datetime, timedelta
+from typing import Protocol
+import logging
+
+from config import STORAGE_BACKEND, DATABASE_PATH, DEFAULT_TIMEZONE
+from database import Database, STATUSES, add_fingerprint, advance_streak, check_status, visible_streak
+
+logger = logging.getLogger(__name__)
+
+
+class Storage(Protocol):
+    """Хранилище пользователей, будильников, состояний и статистики.
+
+    Методы синхронные; асинхронный доступ дает database.AsyncDatabase.
+    blocking - методы ходят на диск, и AsyncDatabase выполняет их в потоках;
+    иначе они вызываются прямо в цикле событий.
+    """
+
+    blocking: bool
+
+    def save_user(self, user_id: int, first_name: str, username: str): ...
+
+    def get_timezone(self, user_id: int): ...
+
+    def set_timezone(self, user_id: int, timezone: str): ...
+
+    def get_user_state(self, user_id: int): ...
+
+    def set_user_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                       deadline_kind: str = None, deadline_at: int = None, outcome: str = None,
+                       solve_time_1: int = None, solve_time_2: int = None): ...
+
+    def write_batch(self, states, statistics, sketches=()): ...
+
+    def get_active_sessions(self, shard_count: int = 1, shard_index: int = 0): ...
+
+    def get_fingerprints(self, shard_count: int = 1, shard_index: int = 0): ...
+
+    def set_alarm(self, user_id: int, start_minute: int, end_minute: int, wake_minute: int, next_fire_at: int): ...
+
+    def get_active_alarms(self, shard_count: int = 1, shard_index: int = 0): ...
+
+    def update_alarm_wake_time(self, user_id: int, wake_minute: int, next_fire_at: int): ...
+
+    def update_alarm_wake_times(self, wake_times): ...
+
+    def add_statistics(self, user_id: int, status: str, solve_time_1: int = None, solve_time_2: int = None): ...
+
+    def get_statistics(self, user_id: int, days: int = 7): ...
+
+    def get_statistics_report(self, user_id: int): ...
+
+    def get_sketch(self, scope: str, key: str): ...
+
+    def get_sketches(self, scope: str): ...
+
+    def close(self): ...
+
+
+class MemoryStorage:
+    """Хранилище в памяти процесса на словарях - для нагрузочных тестов и замеров.
+
+    Повторяет поведение Database, но ничего не сохраняет между запусками.
+    Не потокобезопасно: AsyncDatabase вызывает его только из цикла событий.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self._users = {}         # user_id -> {'first_name', 'username', 'timezone', 'created_at'}
+        self._alarms = {}        # user_id -> [start_minute, end_minute, wake_minute, next_fire_at, created_at]
+        self._states = {}        # user_id -> (state, question, answer, puzzle_sent_at, deadline_kind, deadline_at)
+        self._with_deadline = set()  # индекс: пользователи, у которых есть дедлайн
+        self._statistics = []    # (user_id, date, status, solve_time_1, solve_time_2) - история итогов
+        self._daily = {}         # user_id -> {day: [success, failed_first, failed_second]}
+        self._user_stats = {}    # user_id -> [success, failed_first, failed_second, streak, best_streak, last_success_day]
+        self._sketches = {}      # (scope, key) -> bytes
+        logger.info("✅ Хранилище в памяти готово")
+
+    def close(self):
+        """Освободить данные"""
+        for table in (self._users, self._alarms, self._states, self._with_deadline, self._daily, self._user_stats,
+                      self._sketches):
+            table.clear()
+        self._statistics.clear()
+
+    def save_user(self, user_id: int, first_name: str, username: str):
+        """Сохранить пользователя"""
+        user = self._users.setdefault(user_id, {'timezone': None, 'created_at': datetime.now().isoformat()})
+        user['first_name'] = first_name
+        user['username'] = username
+
+    def get_timezone(self, user_id: int):
+        """Часовой пояс пользователя (имя IANA) или None, если он не выбран"""
+        user = self._users.get(user_id)
+        return user['timezone'] if user else None
+
+    def set_timezone(self, user_id: int, timezone: str):
+        """Сохранить часовой пояс пользователя"""
+        user = self._users.setdefault(user_id, {
+            'first_name': None, 'username': None, 'created_at': datetime.now().isoformat()
+        })
+        user['timezone'] = timezone
+
+    def get_user_state(self, user_id: int):
+        """Получить состояние пользователя"""
+        row = self._states.get(user_id)
+        if row:
+            return {
+                'state': row[0],
+                'current_puzzle_question': row[1],
+                'current_puzzle_answer': row[2]
+            }
+        return None
+
+    def set_user_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                       deadline_kind: str = None, deadline_at: int = None, outcome: str = None,
+                       solve_time_1: int = None, solve_time_2: int = None):
+        """Установить состояние пользователя (и его дедлайн, если есть) и записать итог пробуждения"""
+        check_status(outcome)
+        if outcome is not None:
+            self.add_statistics(user_id, outcome, solve_time_1, solve_time_2)
+        self._write_state(user_id, state, puzzle_question, puzzle_answer, deadline_kind, deadline_at)
+
+    def write_batch(self, states, statistics, sketches=()):
+        """Записать пачку состояний, итогов (user_id, status, solve_time_1, solve_time_2) и скетчей (scope, key, bytes)"""
+        for args in states:
+            self._write_state(*args)
+        for row in statistics:
+            self.add_statistics(*row)
+        for scope, key, sketch in sketches:
+            self._sketches[scope, key] = sketch
+
+    def get_sketch(self, scope: str, key: str):
+        """Сохраненный скетч квантилей (bytes) или None"""
+        return self._sketches.get((scope, key))
+
+    def get_sketches(self, scope: str):
+        """Все скетчи одного вида: список (key, bytes)"""
+        return [(key, sketch) for (sketch_scope, key), sketch in self._sketches.items() if sketch_scope == scope]
+
+    def _write_state(self, user_id: int, state: str, puzzle_question: str = None, puzzle_answer: str = None,
+                     deadline_kind: str = None, deadline_at: int = None):
+        if not (puzzle_question and puzzle_answer):
+            puzzle_question = puzzle_answer = None
+        self._states[user_id] = (state, puzzle_question, puzzle_answer, datetime.now().isoformat(),
+                                 deadline_kind, deadline_at)
+        if deadline_at:
+            self._with_deadline.add(user_id)
+        else:
+            self._with_deadline.discard(user_id)
+
+    def get_active_sessions(self, shard_count: int = 1, shard_index: int = 0):
+        """Незавершенные сценарии пробуждения: список (user_id, state, question, answer, deadline_at, sent_at)"""
+        sessions = []
+        for user_id in self._with_deadline:
+            if user_id % shard_count == shard_index:
+                state, question, answer, sent_at, _, deadline_at = self._states[user_id]
+                sessions.append((user_id, state, question, answer, deadline_at, datetime.fromisoformat(sent_at)))
+        return sessions
+
+    def get_fingerprints(self, shard_count: int = 1, shard_index: int = 0):
+        """Отпечатки будильников (по часовым поясам) и незавершенных сценариев (по состояниям),
+        как у Database.get_fingerprints"""
+        alarms, sessions = {}, {}
+        for user_id, (start_minute, end_minute, _, next_fire_at, _) in self._alarms.items():
+            if user_id % shard_count == shard_index:
+                zone = self.get_timezone(user_id) or DEFAULT_TIMEZONE
+                next_fire_at = -1 if next_fire_at is None else next_fire_at
+                add_fingerprint(alarms, zone, user_id, next_fire_at, start_minute, end_minute)
+        for user_id in self._with_deadline:
+            if user_id % shard_count == shard_index:
+                add_fingerprint(sessions, self._states[user_id][0], user_id)
+        return alarms, sessions
+
+    def set_alarm(self, user_id: int, start_minute: int, end_minute: int, wake_minute: int, next_fire_at: int):
+        """Установить будильник: окно в минутах от начала суток и ближайшее срабатывание (UTC epoch)"""
+        self._alarms[user_id] = [start_minute, end_minute, wake_minute, next_fire_at, datetime.now().isoformat()]
+        logger.info(f"Будильник установлен для пользователя {user_id}: минуты {start_minute} - {end_minute}")
+
+    def get_active_alarms(self, shard_count: int = 1, shard_index: int = 0):
+        """Все будильники (или будильники одного шарда) по возрастанию next_fire_at:
+        (user_id, start_minute, end_minute, wake_minute, next_fire_at, timezone)"""
+        alarms = [
+            (user_id, start_minute, end_minute, wake_minute, next_fire_at, self.get_timezone(user_id))
+            for user_id, (start_minute, end_minute, wake_minute, next_fire_at, _) in self._alarms.items()
+            if user_id % shard_count == shard_index
+        ]
+        # Как в SQLite: будильники без срабатывания (NULL) идут первыми
+        alarms.sort(key=lambda alarm: (alarm[4] is not None, alarm[4] or 0))
+        return alarms
+
+    def update_alarm_wake_time(self, user_id: int, wake_minute: int, next_fire_at: int):
+        """Обновить время пробуждения будильника"""
+        alarm = self._alarms.get(user_id)
+        if alarm:
+            alarm[2], alarm[3] = wake_minute, next_fire_at
+
+    def update_alarm_wake_times(self, wake_times):
+        """Обновить время пробуждения пачки будильников: (user_id, wake_minute, next_fire_at)"""
+        for user_id, wake_minute, next_fire_at in wake_times:
+            self.update_alarm_wake_time(user_id, wake_minute, next_fire_at)
+
+    def add_statistics(self, user_id: int, status: str, solve_time_1: int = None, solve_time_2: int = None):
+        """Добавить запись в статистику и обновить накопительные счетчики"""
+        check_status(status)
+        now = datetime.now()
+        day = now.date()
+        column = STATUSES.index(status)
+        self._statistics.append((user_id, now.isoformat(), status, solve_time_1, solve_time_2))
+
+        self._daily.setdefault(user_id, {}).setdefault(day.isoformat(), [0, 0, 0])[column] += 1
+        stats = self._user_stats.setdefault(user_id, [0, 0, 0, 0, 0, None])
+        stats[column] += 1
+        stats[3:] = advance_streak(status, day, *stats[3:])
+
+    def get_statistics(self, user_id: int, days: int = 7):
+        """Получить статистику пользователя за последние days дней (None - за все время)"""
+        if days is None:
+            return tuple(self._user_stats.get(user_id, (0, 0, 0))[:3])
+
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        totals = [0, 0, 0]
+        for day, counts in self._daily.get(user_id, {}).items():
+            if day >= since:
+                for column, count in enumerate(counts):
+                    totals[column] += count
+        return tuple(totals)
+
+    def get_statistics_report(self, user_id: int):
+        """Статистика за неделю, месяц и все время плюс серия успешных подъемов"""
+        _, _, _, streak, best_streak, last_success_day = self._user_stats.get(user_id, (0, 0, 0, 0, 0, None))
+        return {
+            'week': self.get_statistics(user_id, 7),
+            'month': self.get_statistics(user_id, 30),
+            'total': self.get_statistics(user_id, None),
+            'streak': visible_streak(streak, last_success_day),
+            'best_streak': best_streak,
+        }
+
+
+STORAGE_BACKENDS = {
+    'sqlite': lambda: Database(DATABASE_PATH),
+    'memory': MemoryStorage,
+}
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    """Создать хранилище, выбранное в STORAGE_BACKEND"""
+    try:
+        factory = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Неизвестное хранилище {backend!r}, доступны: {', '.join(STORAGE_BACKENDS)}") from None
+    return factory()
@@ -0,0 +1,251 @@
+import time
+from enum import IntEnum
+from typing import NamedTuple
+
+from config import logger, FIRST_PUZZLE_TIMEOUT, SECOND_PUZZLE_TIMEOUT, DELAY_BETWEEN_PUZZLES
+from keyboards import MAIN_KEYBOARD
+from metrics import PUZZLE_OUTCOMES, SOLVE_TIME
+from puzzles import get_random_puzzle
+
+
+class WakeState(IntEnum):
+    """Состояния сценария пробуждения"""
+    SLEEP = 0
+    FIRST_PUZZLE = 1     # первая головоломка отправлена, ждем ответ
+    WAITING_SECOND = 2   # первая решена, ждем отправки второй
+    SECOND_PUZZLE = 3    # вторая головоломка отправлена, ждем ответ
+
+
+class WakeEvent(IntEnum):
+    """События, которые двигают сценарий"""
+    ALARM = 0      # сработал будильник
+    CORRECT = 1    # верный ответ на текущую головоломку
+    DEADLINE = 2   # наступил дедлайн текущего состояния
+
+
+# Имена состояний в user_states (совпадают с уже сохраненными в базе)
+STATE_NAMES = {
+    WakeState.SLEEP: 'SLEEP',
+    WakeState.FIRST_PUZZLE: 'AWAITING_FIRST_PUZZLE',
+    WakeState.WAITING_SECOND: 'AWAITING_SECOND_PUZZLE',
+    WakeState.SECOND_PUZZLE: 'AWAITING_SECOND_RESPONSE',
+}
+STATES_BY_NAME = {name: state for state, name in STATE_NAMES.items()}
+
+# Состояния, в которых сообщение пользователя - ответ на головоломку
+ANSWER_STATES = frozenset((WakeState.FIRST_PUZZLE, WakeState.SECOND_PUZZLE))
+
+# Какую по счету головоломку решают в состоянии (метка для метрик)
+PUZZLE_LABELS = {WakeState.FIRST_PUZZLE: 'first', WakeState.SECOND_PUZZLE: 'second'}
+
+# Дедлайн каждого состояния: (вид для user_states.deadline_kind, через сколько секунд)
+DEADLINES = {
+    WakeState.FIRST_PUZZLE: ('first_timeout', FIRST_PUZZLE_TIMEOUT),
+    WakeState.WAITING_SECOND: ('second_puzzle', DELAY_BETWEEN_PUZZLES),
+    WakeState.SECOND_PUZZLE: ('second_timeout', SECOND_PUZZLE_TIMEOUT),
+}
+
+
+class Transition(NamedTuple):
+    target: WakeState
+    message: str                # {question} подставляется для новой головоломки
+    new_puzzle: bool = False
+    outcome: str = None         # итог пробуждения для статистики
+    keyboard: bool = False      # вернуть клавиатуру меню
+
+
+FIRST_PUZZLE_MESSAGE = "Доброе утро! ☀️\nПора просыпаться! Реши головоломку:\n\n{question}"
+
+TRANSITIONS = {
+    # Будильник начинает сценарий заново из любого состояния
+    **{(state, WakeEvent.ALARM): Transition(WakeState.FIRST_PUZZLE, FIRST_PUZZLE_MESSAGE, new_puzzle=True)
+       for state in WakeState},
+
+    (WakeState.FIRST_PUZZLE, WakeEvent.CORRECT): Transition(
+        WakeState.WAITING_SECOND, "✅ Верно! Жди вторую головоломку через 10 минут!"),
+    (WakeState.FIRST_PUZZLE, WakeEvent.DEADLINE): Transition(
+        WakeState.SLEEP, "Время вышло! Сегодня не получилось проснуться вовремя 😔",
+        outcome='failed_first', keyboard=True),
+
+    (WakeState.WAITING_SECOND, WakeEvent.DEADLINE): Transition(
+        WakeState.SECOND_PUZZLE, "Тук-тук! 🚪\nТы проснулся точно???\nДокажи! Реши:\n\n{question}",
+        new_puzzle=True),
+
+    (WakeState.SECOND_PUZZLE, WakeEvent.CORRECT): Transition(
+        WakeState.SLEEP, "🎉 Поздравляю! Ты официально проснулся! Хорошего дня! 🌞",
+        outcome='success', keyboard=True),
+    (WakeState.SECOND_PUZZLE, WakeEvent.DEADLINE): Transition(
+        WakeState.SLEEP, "Время вышло! Подъем не подтвержден 😔",
+        outcome='failed_second', keyboard=True),
+}
+
+
+class Session:
+    """Живой сценарий пробуждения одного пользователя.
+
+    sent_at - когда текущая головоломка доставлена (time.time()), solve_time_1 -
+    за сколько секунд решена первая; оба нужны, чтобы записать время решения.
+    """
+
+    __slots__ = ("state", "question", "answer", "category", "sent_at", "solve_time_1")
+
+    def __init__(self, state: WakeState, question: str = None, answer: str = None, category: str = None,
+                 sent_at: float = None, solve_time_1: float = None):
+        self.state = state
+        self.question = question
+        self.answer = answer
+        self.category = category
+        self.sent_at = sent_at
+        self.solve_time_1 = solve_time_1
+
+
+def milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000)
+
+
+class WakeFlow:
+    """Конечный автомат сценария пробуждения.
+
+    Незавершенные сценарии живут в памяти (sessions), дедлайны - в общей
+    очереди таймеров. Каждый переход сохраняется одной записью в базу:
+    состояние, головоломка, дедлайн и итог для статистики вместе. Время от
+    доставки головоломки до верного ответа уходит в итог и в solve_times.
+    """
+
+    def __init__(self, db, deadlines, send, solve_times=None):
+        self.db = db
+        self.deadlines = deadlines
+        self.send = send
+        self.solve_times = solve_times
+        self.sessions = {}  # user_id -> Session, только не SLEEP
+
+    def session(self, user_id: int):
+        """Текущий сценарий пользователя или None"""
+        return self.sessions.get(user_id)
+
+    async def fire(self, user_id: int, event: WakeEvent, reply=None) -> bool:
+        """Применить событие; False, если в текущем состоянии оно ничего не значит.
+
+        reply - корутина-ответ на сообщение пользователя; без нее сообщение уходит через очередь.
+        """
+        previous = self.sessions.get(user_id)
+        state = previous.state if previous else WakeState.SLEEP
+        transition = TRANSITIONS.get((state, event))
+        if transition is None:
+            return False
+
+        now = time.time()
+        if transition.new_puzzle:
+            puzzle = get_random_puzzle()
+            question, answer, category = puzzle['question'], puzzle['answer'], puzzle.get('category')
+        elif previous:
+            question, answer, category = previous.question, previous.answer, previous.category
+        else:
+            question = answer = category = None
+
+        # Время решения: от доставки текущей головоломки до верного ответа
+        solve_time = None
+        if event == WakeEvent.CORRECT and previous and previous.sent_at:
+            solve_time = max(0.0, now - previous.sent_at)
+        solve_time_1 = previous.solve_time_1 if previous and event != WakeEvent.ALARM else None
+        if state == WakeState.FIRST_PUZZLE and solve_time is not None:
+            solve_time_1 = solve_time
+        solve_time_2 = solve_time if state == WakeState.SECOND_PUZZLE else None
+
+        deadline_kind, deadline_at = None, None
+        if transition.target in DEADLINES:
+            deadline_kind, delay = DEADLINES[transition.target]
+            deadline_at = round(now) + delay
+
+        # Память обновляется до записи, чтобы следующее событие увидело новое состояние
+        previous_deadline = self.deadlines.get(user_id)
+        session = None
+        if transition.target == WakeState.SLEEP:
+            self.sessions.pop(user_id, None)
+            self.deadlines.cancel(user_id)
+        else:
+            session = Session(transition.target, question, answer, category,
+                              now if transition.new_puzzle else None, solve_time_1)
+            self.sessions[user_id] = session
+            self.deadlines.schedule(user_id, deadline_at)
+
+        try:
+            await self.db.set_user_state(
+                user_id, STATE_NAMES[transition.target], question, answer,
+                deadline_kind, deadline_at, transition.outcome,
+                milliseconds(solve_time_1), milliseconds(solve_time_2)
+            )
+        except Exception:
+            self._restore(user_id, previous, previous_deadline)
+            raise
+
+        if transition.outcome:
+            PUZZLE_OUTCOMES.inc(transition.outcome)
+        text = transition.message.format(question=question) if transition.new_puzzle else transition.message
+        kwargs = {'reply_markup': MAIN_KEYBOARD} if transition.keyboard else {}
+        if reply:
+            await reply(text, **kwargs)
+            if transition.new_puzzle:
+                session.sent_at = time.time()
+        elif transition.new_puzzle:
+            self.send(user_id, text, on_sent=lambda: self._delivered(user_id, session), **kwargs)
+        else:
+            self.send(user_id, text, **kwargs)
+
+        if solve_time is not None:
+            SOLVE_TIME.observe(solve_time, PUZZLE_LABELS[state], previous.category or 'unknown')
+            if self.solve_times:
+                await self.solve_times.record(user_id, previous.category, solve_time)
+        return True
+
+    def _delivered(self, user_id: int, session: Session):
+        # Время решения считается от фактической доставки, а не от постановки в очередь
+        if self.sessions.get(user_id) is session:
+            session.sent_at = time.time()
+
+    async def load(self, shard_count: int, shard_index: int):
+        """Восстановить незавершенные сценарии из базы после перезапуска"""
+        self.sessions.clear()
+        self.deadlines.clear()
+        sessions = await self.db.get_active_sessions(shard_count, shard_index)
+        for user_id, name, question, answer, deadline_at, sent_at in sessions:
+            state = STATES_BY_NAME.get(name, WakeState.SLEEP)
+            if state == WakeState.SLEEP:
+                continue
+            # Категория и время решения первой головоломки в базе не хранятся
+            if state not in ANSWER_STATES or sent_at is None:
+                sent_at = None
+            else:
+                sent_at = sent_at.timestamp()
+            self.sessions[user_id] = Session(state, question, answer, sent_at=sent_at)
+            self.deadlines.schedule(user_id, deadline_at)
+        logger.info(f"Восстановлено незавершенных пробуждений: {len(self.sessions)}")
+
+    def export_sessions(self):
+        """Незавершенные сценарии с дедлайнами для снимка: список (user_id, Session, deadline_at)"""
+        return [
+            (user_id, session, self.deadlines.get(user_id)[0] if user_id in self.deadlines else None)
+            for user_id, session in self.sessions.items()
+        ]
+
+    def restore(self, sessions):
+        """Восстановить сценарии из снимка: (user_id, Session, deadline_at) - вместе с тем, чего нет в базе"""
+        self.sessions.clear()
+        self.deadlines.clear()
+        for user_id, session, deadline_at in sessions:
+            self.sessions[user_id] = session
+            if deadline_at is not None:
+                self.deadlines.schedule(user_id, deadline_at)
+        logger.info(f"Восстановлено незавершенных пробуждений из снимка: {len(self.sessions)}")
+
+    def _restore(self, user_id: int, previous, previous_deadline):
+        # Запись не удалась - возвращаем сценарий и его дедлайн как были
+        if previous is None:
+            self.sessions.pop(user_id, None)
+        else:
+            self.sessions[user_id] = previous
+
+        if previous_deadline is None:
+            self.deadlines.cancel(user_id)
+        else:
+            self.deadlines.schedule(user_id, previous_deadline[0])